@@ -0,0 +1,62 @@
+"""`common.chiper.ChiperManager`のトークンの形式ごとの速度を比較するベンチマークです。
+
+実行方法: `python -m benchmarks.chiper [--quick]`"""
+
+from __future__ import annotations
+
+from typing import Any
+from collections.abc import Callable
+
+from argparse import ArgumentParser
+from os import urandom
+from time import perf_counter
+
+from cryptography.fernet import Fernet
+
+from common.chiper import ChiperManager, TokenFormat
+
+
+SIZES = (32, 1024, 64 * 1024, 1024 * 1024)
+FORMATS: tuple[TokenFormat, ...] = ("fernet", "aesgcm", "chacha20")
+
+
+def _timeit(func: Callable[[], Any], seconds: float) -> float:
+    "`func`を`seconds`秒ほど繰り返し実行して、一回あたりの秒数を返します。"
+    number, start = 0, perf_counter()
+    while (elapsed := perf_counter() - start) < seconds:
+        func()
+        number += 1
+    return elapsed / number
+
+
+def main(quick: bool = False) -> None:
+    key, seconds = Fernet.generate_key(), 0.05 if quick else 0.5
+    print(f"{'format':<10} {'size':>9} {'api':<8} {'encrypt':>12} {'decrypt':>12} {'MB/s (round trip)':>18}")
+    for size in SIZES:
+        data = urandom(size)
+        text = data.hex()[:size]
+        for token_format in FORMATS:
+            manager = ChiperManager(key, token_format)
+
+            token = manager.encrypt(text)
+            encrypt = _timeit(lambda: manager.encrypt(text), seconds)
+            decrypt = _timeit(lambda: manager.decrypt(token), seconds)
+            print(
+                f"{token_format:<10} {size:>9} {'str':<8} {encrypt * 1e6:>9.2f} us "
+                f"{decrypt * 1e6:>9.2f} us {size / (encrypt + decrypt) / 1e6:>18.1f}"
+            )
+
+            raw = manager.seal(data)
+            view = memoryview(data)
+            encrypt = _timeit(lambda: manager.seal(view), seconds)
+            decrypt = _timeit(lambda: manager.unseal(raw), seconds)
+            print(
+                f"{token_format:<10} {size:>9} {'bytes':<8} {encrypt * 1e6:>9.2f} us "
+                f"{decrypt * 1e6:>9.2f} us {size / (encrypt + decrypt) / 1e6:>18.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="時間を短くして実行します。")
+    main(parser.parse_args().quick)
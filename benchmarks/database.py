@@ -0,0 +1,139 @@
+"""`common.database`のオーバーヘッドを`common.fake_database`を使って計測するベンチマークです。
+実際のMySQLは使わないので、計測されるのはライブラリ自身のコスト（ラッパー、接続の取得、カーソルの作成）です。
+
+実行方法: `python -m benchmarks.database [--quick]`"""
+
+from __future__ import annotations
+
+from typing import Any
+from collections.abc import Awaitable, Callable
+
+from argparse import ArgumentParser
+from asyncio import gather, run
+from time import perf_counter
+
+from common.database import DatabaseManager, DatabasePools, fetchstep, fetchrange, cursor
+from common.fake_database import FakePool, create_fake_pool
+
+
+class _Manager(DatabaseManager):
+    def __init__(self, pool: FakePool) -> None:
+        self.db = pool # type: ignore
+
+    async def select_one(self) -> Any:
+        await cursor.execute("SELECT 1;")
+        return await cursor.fetchone()
+
+    async def select_all(self) -> Any:
+        async for row in fetchstep(cursor, "SELECT * FROM Test;", cycle=100):
+            yield row
+
+
+async def _direct_select_one(pool: FakePool) -> Any:
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute("SELECT 1;")
+            return await cursor.fetchone()
+
+
+async def _timeit(func: Callable[[], Awaitable[Any]], number: int) -> float:
+    "`func`を`number`回実行して、一回あたりの秒数を返します。"
+    start = perf_counter()
+    for _ in range(number):
+        await func()
+    return (perf_counter() - start) / number
+
+
+def _report(name: str, seconds: float, extra: str = "") -> None:
+    print(f"{name:<48} {seconds * 1_000_000:>12.2f} us {extra}")
+
+
+async def bench_wrapper_overhead(number: int) -> None:
+    "`.DatabaseManager`のラッパーを経由した場合と直接プールを使った場合を比較します。"
+    pool = FakePool(((1,),))
+    manager = _Manager(pool)
+    # 初回の呼び出しではメソッドのソースの書き換えが行われるので、計測から除く。
+    await manager.select_one()
+
+    direct = await _timeit(lambda: _direct_select_one(pool), number)
+    wrapped = await _timeit(manager.select_one, number)
+    async with pool.acquire() as conn:
+        async with conn.cursor() as c:
+            passed = await _timeit(lambda: manager.select_one(cursor=c), number)
+
+    _report("direct acquire + cursor + execute", direct)
+    _report("DatabaseManager wrapper", wrapped, f"(+{(wrapped - direct) * 1_000_000:.2f} us)")
+    _report("DatabaseManager wrapper (cursor passed)", passed)
+
+
+async def bench_fetchstep(rows: int) -> None:
+    "`.fetchstep`の一行あたりのコストを`cycle`ごとに計測します。"
+    pool = FakePool([(i, f"name-{i}") for i in range(rows)])
+    for cycle in (10, 50, 100, 1000):
+        async with pool.acquire() as conn:
+            async with conn.cursor() as c:
+                start = perf_counter()
+                count = 0
+                async for _ in fetchstep(c, "SELECT * FROM Test;", cycle=cycle):
+                    count += 1
+                elapsed = perf_counter() - start
+        assert count == rows
+        _report(f"fetchstep rows={rows} cycle={cycle} (per row)", elapsed / rows)
+
+
+async def bench_fetchrange(rows: int, latency: float) -> None:
+    "一つの接続の`.fetchstep`と複数の接続の`.fetchrange`で、テーブル全体を読み込む時間を比較します。"
+    data = [(i, f"name-{i}") for i in range(rows)]
+    pool = FakePool(
+        lambda sql, args: data if args is None else data[args[0]:args[1]],
+        latency=latency, maxsize=8
+    )
+    async with pool.acquire() as conn:
+        async with conn.cursor() as c:
+            start = perf_counter()
+            async for _ in fetchstep(c, "SELECT * FROM Test;", cycle=500):
+                pass
+            _report(f"fetchstep rows={rows} (total)", perf_counter() - start)
+    for connections in (2, 4, 8):
+        for ordered in (False, True):
+            start = perf_counter()
+            async for _ in fetchrange(
+                pool, "SELECT * FROM Test WHERE id >= %s AND id < %s;",
+                range(0, rows + 1, rows // (connections * 4)),
+                connections=connections, cycle=500, ordered=ordered
+            ):
+                pass
+            _report(
+                f"fetchrange rows={rows} connections={connections} ordered={ordered}",
+                perf_counter() - start
+            )
+
+
+async def bench_concurrency(tasks_list: tuple[int, ...], latency: float) -> None:
+    "同時に大量のタスクが`.DatabasePools`の読み込み用のプールを使った場合の所要時間を計測します。"
+    pool = await create_fake_pool(((1,),), latency=latency, maxsize=10)
+    pools = DatabasePools(pool, pool) # type: ignore
+    manager = _Manager(pools.read) # type: ignore
+    for tasks in tasks_list:
+        start = perf_counter()
+        await gather(*(manager.select_one() for _ in range(tasks)))
+        elapsed = perf_counter() - start
+        ideal = latency * tasks / pools.read.maxsize
+        _report(
+            f"concurrency tasks={tasks} latency={latency * 1000:g}ms",
+            elapsed / tasks, f"total={elapsed:.3f}s ideal={ideal:.3f}s"
+        )
+    pools.close()
+
+
+async def main(quick: bool = False) -> None:
+    await bench_wrapper_overhead(2_000 if quick else 20_000)
+    await bench_fetchstep(2_000 if quick else 100_000)
+    await bench_fetchrange(20_000 if quick else 200_000, 0.002)
+    await bench_concurrency((100, 1_000) if quick else (100, 1_000, 10_000), 0.001)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="回数を減らして短時間で実行します。")
+    run(main(parser.parse_args().quick))
@@ -0,0 +1,85 @@
+"""`common`の各モジュールの読み込みにかかる時間を`python -X importtime`で計測するベンチマークです。
+軽いはずのモジュールが重い依存関係（`psutil`や`aiomysql`など）を読み込んでいる場合は、退行として終了コード`1`で終了します。
+`--max-ms`を指定すると、読み込みにそれ以上かかったモジュールも退行として扱います。
+
+実行方法: `python -m benchmarks.import_time [--quick] [--max-ms MS]`"""
+
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from statistics import median
+from subprocess import run
+from sys import executable, exit
+
+
+HEAVY = ("psutil", "aiomysql", "cryptography", "aiofiles", "concurrent.futures", "asyncio")
+"読み込みに時間がかかる依存関係です。"
+MODULES: dict[str, tuple[str, ...]] = {
+    "common.json": HEAVY,
+    "common.reply_error": HEAVY,
+    "common.types_": HEAVY,
+    "common.config": HEAVY,
+    "common.log": HEAVY,
+    "common.utils": HEAVY,
+    "common.utils.span": HEAVY,
+    "common.hash": HEAVY,
+    "common.chiper": HEAVY,
+    "common.database": HEAVY,
+    # `CountableEvent`が`asyncio.Event`を継承しているので、`asyncio`は読み込まれる。
+    "common.cacher": ("psutil", "aiomysql", "cryptography", "aiofiles")
+}
+"計測するモジュールと、そのモジュールを読み込んだ際に読み込まれてはいけないモジュールです。"
+
+
+def measure(module: str) -> tuple[float, set[str]]:
+    """新しいプロセスで`module`を読み込み、読み込みにかかった時間（マイクロ秒）と読み込まれたモジュールの名前を返します。
+    時間は`-X importtime`の累積の時間です。"""
+    result = run(
+        (executable, "-X", "importtime", "-c", f"import {module}"),
+        capture_output=True, text=True, check=True
+    )
+    cumulative, imported = 0., set[str]()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, raw_cumulative, name = line.split("|", 2)
+        if not raw_cumulative.strip().isdigit():
+            # ヘッダの行
+            continue
+        imported.add(name := name.strip())
+        if name == module:
+            cumulative = float(raw_cumulative)
+    return cumulative, imported
+
+
+def main(quick: bool = False, max_ms: float | None = None) -> int:
+    repeat, regressions = 1 if quick else 5, list[str]()
+    print(f"{'module':<20} {'import time':>12}  heavy dependencies")
+    for module, forbidden in MODULES.items():
+        times, imported = list[float](), set[str]()
+        for _ in range(repeat):
+            cumulative, imported = measure(module)
+            times.append(cumulative)
+        elapsed = median(times) / 1000
+        loaded = [name for name in HEAVY if name in imported]
+        print(f"{module:<20} {elapsed:>9.1f} ms  {', '.join(loaded) or '-'}")
+
+        if leaked := [name for name in loaded if name in forbidden]:
+            regressions.append(f"{module}を読み込むと{', '.join(leaked)}も読み込まれます。")
+        if max_ms is not None and elapsed > max_ms:
+            regressions.append(f"{module}の読み込みに{elapsed:.1f}ミリ秒かかりました。（閾値: {max_ms}ミリ秒）")
+
+    if regressions:
+        print("\n退行が見つかりました:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="計測を一回だけにして実行します。")
+    parser.add_argument("--max-ms", type=float, help="読み込みにかかる時間の閾値（ミリ秒）です。")
+    args = parser.parse_args()
+    exit(main(args.quick, args.max_ms))
@@ -0,0 +1,213 @@
+"""`common`の呼び出しごとに使われる関数のマイクロベンチマークです。
+関数ごとに、一秒あたりの実行回数と、一回あたりの処理時間のp50とp99、`tracemalloc`で計測したメモリの確保量をJSONで出力します。
+`--save`で結果を保存しておき、`--compare`でそれと比較すると、許容範囲（`--tolerance`）を超えて遅くなったものを退行として終了コード`1`で終了します。
+
+実行方法: `python -m benchmarks.micro [--quick] [--filter NAME] [--save FILE] [--compare FILE] [--tolerance RATIO]`"""
+
+from __future__ import annotations
+
+from typing import Any
+from collections.abc import Callable, Iterator
+
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from dataclasses import dataclass
+from os import remove, urandom
+from sys import exit
+from tempfile import NamedTemporaryFile
+from time import perf_counter_ns
+import tracemalloc
+
+from orjson import OPT_INDENT_2
+
+from cryptography.fernet import Fernet
+
+from common.json import dumps, dumps_bytes, loads
+from common.utils import CooldownManager, camel_to_snake_case, \
+    dict_camel_to_snake_case, deep_camel_to_snake_case, make_self_from_row
+from common.chiper import ChiperManager
+from common.hash import get_hash, get_file_hash
+from common.cacher import Cacher
+
+
+Benchmark = Callable[[], Any]
+
+
+def _make_payload(users: int) -> dict[str, Any]:
+    "APIのレスポンスのような、キャメルケースのキーを持つ辞書を作ります。"
+    return {
+        "requestId": "0123456789abcdef", "nextPageToken": None, "totalCount": users,
+        "users": [{
+            "userId": 10 ** 17 + i, "userName": f"user{i}", "displayName": f"ユーザー{i}",
+            "avatarUrl": f"https://cdn.example.com/avatars/{i}.png", "isBot": False,
+            "createdAt": "2024-01-01T00:00:00+00:00", "publicFlags": 64,
+            "guildSettings": {"nickName": None, "joinedAt": "2024-01-02T00:00:00+00:00", "roleIds": [1, 2, 3]}
+        } for i in range(users)]
+    }
+
+
+@dataclass
+class _Row:
+    id: int
+    name: str
+    guild_id: int
+    created_at: str
+    settings: str
+    enabled: bool
+
+
+@contextmanager
+def _temporary_file(size: int) -> Iterator[str]:
+    with NamedTemporaryFile(delete=False) as f:
+        f.write(urandom(size))
+    try:
+        yield f.name
+    finally:
+        remove(f.name)
+
+
+@contextmanager
+def _benchmarks() -> Iterator[dict[str, Benchmark]]:
+    "計測する処理の名前と、その処理を一回実行する関数の辞書を作ります。"
+    small, large = _make_payload(1), _make_payload(100)
+    small_json, large_json = dumps_bytes(small), dumps_bytes(large)
+    chiper = ChiperManager(Fernet.generate_key())
+    text = dumps(small)
+    token = chiper.encrypt(text)
+    aead_chiper = ChiperManager(chiper.key, "aesgcm")
+    aead_token = aead_chiper.encrypt(text)
+    row = (1, "name", 10 ** 17, "2024-01-01 00:00:00", '{"a": 1}', True)
+    cooldown = CooldownManager[int](Cacher())
+    hash_data = urandom(4096)
+
+    with _temporary_file(1024 * 1024) as file_path:
+        try:
+            yield {
+                "json.dumps/small": lambda: dumps(small),
+                "json.dumps/large": lambda: dumps(large),
+                "json.dumps_bytes/large": lambda: dumps_bytes(large),
+                "json.loads/small": lambda: loads(small_json),
+                "json.loads/large": lambda: loads(large_json),
+                "utils.camel_to_snake_case": lambda: camel_to_snake_case("guildSettingsUpdatedAt"),
+                "utils.camel_to_snake_case/uncached": lambda: camel_to_snake_case.__wrapped__("guildSettingsUpdatedAt"),
+                "utils.dict_camel_to_snake_case": lambda: dict_camel_to_snake_case(small["users"][0]),
+                "utils.deep_camel_to_snake_case/large": lambda: deep_camel_to_snake_case(large),
+                "utils.make_self_from_row": lambda: make_self_from_row(_Row, row),
+                "chiper.encrypt/fernet": lambda: chiper.encrypt(text),
+                "chiper.decrypt/fernet": lambda: chiper.decrypt(token),
+                "chiper.encrypt/aesgcm": lambda: aead_chiper.encrypt(text),
+                "chiper.decrypt/aesgcm": lambda: aead_chiper.decrypt(aead_token),
+                "hash.get_hash/4KB": lambda: get_hash(hash_data),
+                "hash.get_file_hash/1MB": lambda: get_file_hash(file_path),
+                "utils.CooldownManager.check": lambda: cooldown.check(1)
+            }
+        finally:
+            cooldown.close()
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))]
+
+
+def measure(func: Benchmark, seconds: float) -> dict[str, float]:
+    """`func`を`seconds`秒ほど繰り返し実行して計測します。
+    一回ごとの計測は`perf_counter_ns`自体のコストが大きいので、数回をまとめて計測した一回あたりの時間をパーセンタイルに使います。"""
+    # まとめて実行する回数を、一まとまりが10マイクロ秒以上になるように決める。
+    start = perf_counter_ns()
+    func()
+    batch = max(1, 10_000 // max(perf_counter_ns() - start, 1))
+
+    samples, deadline = list[float](), perf_counter_ns() + int(seconds * 1e9)
+    total_ns = number = 0
+    while (now := perf_counter_ns()) < deadline:
+        for _ in range(batch):
+            func()
+        elapsed = perf_counter_ns() - now
+        samples.append(elapsed / batch)
+        total_ns += elapsed
+        number += batch
+    samples.sort()
+
+    # メモリの確保量は、計測のオーバーヘッドが大きいので別に計測する。
+    allocations = max(1, min(number, 100))
+    tracemalloc.start()
+    try:
+        peak = retained = 0
+        for _ in range(allocations):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            result = func()
+            peak += tracemalloc.get_traced_memory()[1] - current
+            del result
+            retained += tracemalloc.get_traced_memory()[0] - current
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops_per_sec": number / total_ns * 1e9,
+        "p50_ns": _percentile(samples, 50), "p99_ns": _percentile(samples, 99),
+        "peak_alloc_bytes": peak / allocations,
+        "retained_bytes": retained / allocations,
+        "calls": number
+    }
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    tolerance: float
+) -> list[str]:
+    """結果を基準と比較して、退行しているものの説明を返します。
+    一秒あたりの実行回数とp99は`tolerance`の割合まで、メモリの確保量は`tolerance`の割合と64バイトまで悪化しても許容します。"""
+    regressions = list[str]()
+    for name, result in results.items():
+        if (base := baseline.get(name)) is None:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: 一秒あたりの実行回数が{base['ops_per_sec']:.0f}から{result['ops_per_sec']:.0f}に減りました。"
+            )
+        if result["p99_ns"] > base["p99_ns"] * (1 + tolerance):
+            regressions.append(f"{name}: p99が{base['p99_ns']:.0f}nsから{result['p99_ns']:.0f}nsに増えました。")
+        if result["peak_alloc_bytes"] > base["peak_alloc_bytes"] * (1 + tolerance) + 64:
+            regressions.append(
+                f"{name}: メモリの確保量が{base['peak_alloc_bytes']:.0f}Bから{result['peak_alloc_bytes']:.0f}Bに増えました。"
+            )
+    return regressions
+
+
+def main(
+    quick: bool = False, filter_: str | None = None,
+    save: str | None = None, baseline: str | None = None,
+    tolerance: float = 0.2
+) -> int:
+    seconds, results = 0.05 if quick else 0.5, dict[str, dict[str, float]]()
+    with _benchmarks() as benchmarks:
+        for name, func in benchmarks.items():
+            if filter_ is None or filter_ in name:
+                results[name] = measure(func, seconds)
+    print(dumps(results, option=OPT_INDENT_2))
+
+    if save is not None:
+        with open(save, "wb") as f:
+            f.write(dumps_bytes(results))
+    if baseline is not None:
+        with open(baseline, "rb") as f:
+            regressions = compare(results, loads(f.read()), tolerance)
+        if regressions:
+            print("\n退行が見つかりました:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="時間を短くして実行します。")
+    parser.add_argument("--filter", help="名前にこの文字列を含むものだけを計測します。")
+    parser.add_argument("--save", help="結果をこのファイルにJSONで保存します。")
+    parser.add_argument("--compare", help="このファイルに保存された結果と比較します。")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="比較の際に許容する悪化の割合です。")
+    args = parser.parse_args()
+    exit(main(args.quick, args.filter, args.save, args.compare, args.tolerance))
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-__all__ = ("Container", "Cache", "DictCache", "MutableSetCache", "Cacher")
+__all__ = (
+    "Container", "Cache", "DictCache", "MutableSetCache", "Cacher",
+    "ValueCodec", "CompressedValue"
+)
 
-from typing import TypeVar, Any
+from typing import TYPE_CHECKING, TypeVar, Any
 
 from threading import Thread
 from asyncio import Event
@@ -15,6 +18,17 @@ from .common import Container, Cache
 from .impl.dict_ import DictCache
 from .impl.set_ import MutableSetCache
 
+if TYPE_CHECKING:
+    from .codec import ValueCodec, CompressedValue
+
+
+def __getattr__(name: str) -> Any:
+    "`.codec`のクラスを、初めて使われた時に読み込みます。（orjsonの読み込みを遅らせるためです。）"
+    if name in ("ValueCodec", "CompressedValue"):
+        from . import codec
+        return getattr(codec, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 @dataclass
 class CountableEvent(Event):
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+__all__ = ("CompressedValue", "ValueCodec", "CompressionAlgorithm")
+
+from typing import TypeAlias, Literal, Any
+from collections.abc import Callable
+
+from dataclasses import dataclass
+from time import thread_time_ns
+
+from orjson import dumps, loads, OPT_PASSTHROUGH_DATETIME, \
+    OPT_PASSTHROUGH_DATACLASS, OPT_PASSTHROUGH_SUBCLASS
+
+
+_DUMPS_OPTIONS = OPT_PASSTHROUGH_DATETIME | OPT_PASSTHROUGH_DATACLASS | OPT_PASSTHROUGH_SUBCLASS
+"JSONから読み込んだ際に元の型に戻らないものを、JSONにせずにエラーにするためのオプションです。"
+
+
+def _reject(_: Any) -> Any:
+    raise TypeError
+
+
+CompressionAlgorithm: TypeAlias = Literal["zlib", "lzma"]
+"`.ValueCodec`で使える圧縮の方式です。"
+
+
+@dataclass(slots=True)
+class CompressedValue:
+    "`.ValueCodec`で圧縮された値です。キャッシュのコンテナにはこれがそのまま格納されます。"
+
+    data: bytes
+    raw_size: int
+    "圧縮する前のJSONの大きさ"
+
+
+class ValueCodec:
+    """`.DictCache`の値を圧縮するためのクラスです。
+    JSONにした際の大きさが`threshold`バイト以上の値だけをorjsonでJSONにしてから`algorithm`で圧縮し、取り出す際に展開します。
+    小さい値やJSONにできない値はそのまま格納されるので、頻繁に使われる小さい値の読み書きは遅くなりません。
+    圧縮された値はJSONを経由するので、取り出す度に新しいオブジェクトになります。
+    文字列以外のキーや`datetime`、データクラス、`str`や`int`などのサブクラスを含む値は、元の型に戻らないので圧縮しません。
+    ただし、タプルはリストに、`UUID`は文字列に、`Enum`はその値になるので、これらを含む値を格納する場合は使わないでください。
+    圧縮率と圧縮と展開にかかったCPU時間は`.export`で取得できます。"""
+
+    ENCODABLE_TYPES: tuple[type, ...] = (dict, list, tuple, str)
+    "圧縮の対象にする値の型です。これ以外の型の値はJSONにせずにそのまま格納されます。"
+
+    def __init__(
+        self, algorithm: CompressionAlgorithm = "zlib",
+        threshold: int = 1024, level: int | None = None
+    ) -> None:
+        self.algorithm, self.threshold, self.level = algorithm, threshold, level
+        self._compress, self._decompress = self._make_functions(algorithm, level)
+        self.compressed_count = self.raw_bytes = self.compressed_bytes = 0
+        "圧縮した回数と、圧縮する前と後の大きさの合計です。"
+        self.compress_ns = self.decompress_ns = 0
+        "圧縮（JSONにするのを含む）と展開（JSONを読み込むのを含む）にかかったCPU時間の合計（ナノ秒）です。"
+        self.skipped_count = 0
+        "JSONにしたものの、`threshold`より小さかったので圧縮しなかった回数です。"
+
+    @staticmethod
+    def _make_functions(
+        algorithm: CompressionAlgorithm, level: int | None
+    ) -> tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+        if algorithm == "zlib":
+            from zlib import compress, decompress, Z_DEFAULT_COMPRESSION
+            level = Z_DEFAULT_COMPRESSION if level is None else level
+            return lambda data: compress(data, level), decompress
+        if algorithm == "lzma":
+            from lzma import compress, decompress, PRESET_DEFAULT
+            level = PRESET_DEFAULT if level is None else level
+            return lambda data: compress(data, preset=level), decompress
+        raise ValueError(f"不明な圧縮の方式です: {algorithm}")
+
+    def encode(self, value: Any) -> Any:
+        "値を格納する形にします。圧縮する場合は`.CompressedValue`を返し、そうでない場合は値をそのまま返します。"
+        if not isinstance(value, self.ENCODABLE_TYPES) \
+                or isinstance(value, str) and len(value) < self.threshold // 4:
+            # UTF-8では一文字が最大四バイトなので、これより短ければ閾値に届かない。
+            return value
+        start = thread_time_ns()
+        try:
+            raw = dumps(value, _reject, _DUMPS_OPTIONS)
+        except TypeError:
+            self.compress_ns += thread_time_ns() - start
+            return value
+        if len(raw) < self.threshold:
+            self.compress_ns += thread_time_ns() - start
+            self.skipped_count += 1
+            return value
+        compressed = CompressedValue(self._compress(raw), len(raw))
+        self.compress_ns += thread_time_ns() - start
+        self.compressed_count += 1
+        self.raw_bytes += len(raw)
+        self.compressed_bytes += len(compressed.data)
+        return compressed
+
+    def decode(self, body: Any) -> Any:
+        "格納されている形から値を取り出します。"
+        if not isinstance(body, CompressedValue):
+            return body
+        start = thread_time_ns()
+        value = loads(self._decompress(body.data))
+        self.decompress_ns += thread_time_ns() - start
+        return value
+
+    @property
+    def ratio(self) -> float:
+        "圧縮率（圧縮後の大きさ / 圧縮前の大きさ）です。まだ圧縮していない場合は`1.`です。"
+        return self.compressed_bytes / self.raw_bytes if self.raw_bytes else 1.
+
+    def export(self) -> dict[str, Any]:
+        "統計を辞書で返します。時間の単位はナノ秒です。"
+        return {
+            "algorithm": self.algorithm, "threshold": self.threshold,
+            "compressed_count": self.compressed_count, "skipped_count": self.skipped_count,
+            "raw_bytes": self.raw_bytes, "compressed_bytes": self.compressed_bytes,
+            "ratio": self.ratio, "compress_ns": self.compress_ns,
+            "decompress_ns": self.decompress_ns
+        }
+
+    def __str__(self) -> str:
+        return f"<ValueCodec algorithm={self.algorithm} threshold={self.threshold} ratio={self.ratio:.3f}>"
@@ -79,7 +79,7 @@ class Cache(ABC):
         self.cleaned.set()
 
         if on_dead is not None:
-            self.don_dead = on_dead
+            self.on_dead = on_dead
 
 
     def on_dead(self, *args: Any, **kwargs: Any) -> Any:
@@ -2,62 +2,197 @@ from __future__ import annotations
 
 __all__ = ("DictCache", "ValuesViewForDictCache", "ItemsViewForDictCache")
 
-from typing import Self, TypeVar, Generic, Any, overload
-from collections.abc import Iterator, Hashable, KeysView, ValuesView, \
+from typing import TYPE_CHECKING, Self, TypeVar, Generic, Any, overload
+from collections.abc import Iterator, Iterable, Hashable, KeysView, ValuesView, \
     ItemsView, MutableMapping, Callable
 
+from random import choices
 from time import time
 
 from ..common import Container, Cache, _TEDIOUS
 
+if TYPE_CHECKING:
+    from ..codec import ValueCodec
+
 
 KeyT, ValueT = TypeVar("KeyT", bound=Hashable), TypeVar("ValueT")
+_identity = lambda body: body
 
 
 class ValuesViewForDictCache(Generic[ValueT], ValuesView[ValueT]):
     "`.DictCache`のための`.ValuesView`の実装です。"
 
-    def __init__(self, original: ValuesView[Container[ValueT]]) -> None:
-        self.original = original
+    def __init__(
+        self, original: ValuesView[Container[ValueT]],
+        decode: Callable[[Any], ValueT] = _identity
+    ) -> None:
+        self.original, self.decode = original, decode
 
     def __contains__(self, value: ValueT) -> bool:
-        return any(value == cache.body for cache in self.original)
+        return any(value == self.decode(cache.body) for cache in self.original)
 
     def __iter__(self) -> Iterator[ValueT]:
-        return (cache.body for cache in self.original)
+        return (self.decode(cache.body) for cache in self.original)
 
 class ItemsViewForDictCache(Generic[KeyT, ValueT], ItemsView[KeyT, ValueT]):
     "`.DictCache`のための`.ItemsView`の実装です。"
 
-    def __init__(self, original: ItemsView[KeyT, Container[ValueT]]) -> None:
-        self.original = original
+    def __init__(
+        self, original: ItemsView[KeyT, Container[ValueT]],
+        decode: Callable[[Any], ValueT] = _identity
+    ) -> None:
+        self.original, self.decode = original, decode
 
     def __contains__(self, value: tuple[KeyT, ValueT]) -> bool:
         return any(
-            value[0] == key and value[1] == cache.body
+            value[0] == key and value[1] == self.decode(cache.body)
             for key, cache in self.original
         )
 
     def __iter__(self) -> Iterator[tuple[KeyT, ValueT]]:
-        return ((key, cache.body) for key, cache in self.original)
+        return ((key, self.decode(cache.body)) for key, cache in self.original)
 
 Undefined, DCgT = type("Undefined", (), {}), TypeVar("DCgT")
 class DictCache(Cache, MutableMapping[KeyT, ValueT], Generic[KeyT, ValueT]):
-    "辞書のように使える用に実装した`.Cache`のサブクラスです。"
+    """辞書のように使える用に実装した`.Cache`のサブクラスです。
+
+    `lazy_expiry`を`True`にすると、`.Cacher`のスレッドを使わずに寿命を管理します。
+    その場合、読み込みの際に寿命を確認して、死んだキャッシュは存在しないものとして扱い`.on_dead`を呼びます。
+    また、新しいキーの書き込み`sweep_interval`回ごとに、Redisのように`sweep_samples`個のキーを無作為に選んで死んだキャッシュを消し、
+    その内の`sweep_ratio`より多くが死んでいた場合は（最大`sweep_max_rounds`回まで）繰り返します。
+    これにより、全体を走査することなく少しずつ掃除されるので、メモリの使用量が際限なく増えることはありません。
+    なお、`len`や`.values`、`.items`には、まだ消されていない死んだキャッシュも含まれます。
+
+    `codec`に`.ValueCodec`を渡すと、大きい値を圧縮して格納し、取り出す際に展開します。
+
+    `.set`でキャッシュにタグを付けると、`.invalidate_tag`でそのタグが付いたキャッシュをまとめて消せます。
+    タグからキーへの索引は削除や掃除、寿命切れの際にも更新されるので、消す際の計算量はそのタグが付いたキャッシュの数だけです。"""
 
     def __init__(
         self, *args: Any, data_cls: Callable[[Self],
             MutableMapping[Any, Container[Any]]
-        ] = lambda _: dict(), **kwargs: Any
+        ] = lambda _: dict(), lazy_expiry: bool = False,
+        sweep_samples: int = 20, sweep_ratio: float = 0.25,
+        sweep_max_rounds: int = 16, sweep_interval: int = 10,
+        codec: ValueCodec | None = None, **kwargs: Any
     ) -> None:
         super().__init__(*args, **kwargs)
         self.data: MutableMapping[KeyT, Container[ValueT]] = data_cls(self)
+        self.lazy_expiry, self.sweep_samples = lazy_expiry, sweep_samples
+        self.sweep_ratio, self.sweep_max_rounds = sweep_ratio, sweep_max_rounds
+        self.sweep_interval, self._writes = sweep_interval, 0
+        self.codec = codec
+        self._encode = _identity if codec is None else codec.encode
+        self._decode: Callable[[Any], ValueT] = _identity if codec is None else codec.decode
+        self.tags = dict[Hashable, set[KeyT]]()
+        "タグから、そのタグが付いたキャッシュのキーへの索引です。"
+        self._key_tags = dict[KeyT, set[Hashable]]()
+        # 無作為にキーを選ぶためのキーの配列と、キーからその位置への辞書
+        self._sampling_keys = list[KeyT]()
+        self._sampling_indexes = dict[KeyT, int]()
 
     def on_dead(self, key: KeyT, _: ValueT) -> Any:
         super().on_dead(key)
 
     def delete(self, key: KeyT) -> None:
         del self.data[key]
+        if self.lazy_expiry:
+            self._untrack(key)
+        if self._key_tags:
+            self._untag(key)
+
+    def _untag(self, key: KeyT) -> None:
+        "キーをタグの索引から外します。"
+        for tag in self._key_tags.pop(key, ()):
+            if (keys := self.tags.get(tag)) is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def add_tags(self, key: KeyT, *tags: Hashable) -> None:
+        "キャッシュにタグを付けます。キャッシュが存在しない場合は`KeyError`を発生させます。"
+        if key not in self.data:
+            raise KeyError(key)
+        self._key_tags.setdefault(key, set()).update(tags)
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(key)
+
+    def get_tags(self, key: KeyT) -> frozenset[Hashable]:
+        "キャッシュに付いているタグを返します。"
+        return frozenset(self._key_tags.get(key, ()))
+
+    def set(
+        self, key: KeyT, value: ValueT,
+        tags: Iterable[Hashable] | None = None
+    ) -> None:
+        """値を設定します。`tags`を指定した場合は、キャッシュに付いているタグをそれに置き換えます。
+        `self[key] = value`の場合は、既に付いているタグはそのままです。"""
+        self[key] = value
+        if tags is not None:
+            self._untag(key)
+            self.add_tags(key, *tags)
+
+    def invalidate_tag(self, tag: Hashable) -> int:
+        "タグが付いたキャッシュを全て消して、消した数を返します。消したキャッシュそれぞれについて`.on_dead`が呼ばれます。"
+        count = 0
+        for key in self.tags.pop(tag, ()):
+            if (container := self.data.get(key)) is not None:
+                self._expire(key, container)
+                count += 1
+        return count
+
+    def _track(self, key: KeyT) -> None:
+        "キーを無作為に選ぶ対象に加えます。"
+        if key not in self._sampling_indexes:
+            self._sampling_indexes[key] = len(self._sampling_keys)
+            self._sampling_keys.append(key)
+
+    def _untrack(self, key: KeyT) -> None:
+        "キーを無作為に選ぶ対象から外します。最後のキーと入れ替えてから消すので、O(1)です。"
+        if (index := self._sampling_indexes.pop(key, None)) is None:
+            return
+        last = self._sampling_keys.pop()
+        if index < len(self._sampling_keys):
+            self._sampling_keys[index] = last
+            self._sampling_indexes[last] = index
+
+    def _expire(self, key: KeyT, container: Container[ValueT]) -> None:
+        """死んだキャッシュについて`.on_dead`を呼び、まだ消されていなければ消します。
+        デフォルトの`.on_dead`は値を使わないので、その場合は圧縮された値を展開せずに渡します。"""
+        if "on_dead" in self.__dict__ or type(self).on_dead is not DictCache.on_dead:
+            self.on_dead(key, self._decode(container.body))
+        else:
+            self.on_dead(key, container.body)
+        if self.data.get(key) is container:
+            self.delete(key)
+
+    def _get_alive(self, key: KeyT) -> Container[ValueT] | None:
+        "キャッシュのコンテナを取得します。`lazy_expiry`が有効で死んでいる場合は、消して`None`を返します。"
+        if (container := self.data.get(key)) is not None \
+                and self.lazy_expiry and container.is_dead():
+            self._expire(key, container)
+            return None
+        return container
+
+    def sweep(self) -> int:
+        """無作為に選んだキーの死んだキャッシュを消して、消した数を返します。
+        `lazy_expiry`が有効な場合は、新しいキーの書き込み`sweep_interval`回ごとに呼ばれます。"""
+        now, total, keys = time(), 0, self._sampling_keys
+        for _ in range(self.sweep_max_rounds):
+            if not keys:
+                break
+            samples, expired = min(self.sweep_samples, len(keys)), 0
+            for key in choices(keys, k=samples):
+                if (container := self.data.get(key)) is None:
+                    # `data`が直接書き換えられた場合か、同じキーが二回選ばれた場合
+                    self._untrack(key)
+                elif container.deadline is not None and now > container.deadline:
+                    self._expire(key, container)
+                    expired += 1
+            total += expired
+            if expired <= samples * self.sweep_ratio:
+                break
+        return total
 
     def update_deadline(
         self, seconds: float | None, key: KeyT,
@@ -81,20 +216,31 @@ class DictCache(Cache, MutableMapping[KeyT, ValueT], Generic[KeyT, ValueT]):
 
     def clean(self) -> None:
         now = time()
-        for key in {key for key in self.keys() if self.data[key].is_dead(now)}:
-            del self[key]
+        for key, container in [
+            (key, container) for key, container in self.data.items()
+            if container.is_dead(now)
+        ]:
+            self._expire(key, container)
         super().clean()
 
     def __getitem__(self, key: KeyT) -> ValueT:
+        if (container := self._get_alive(key)) is None:
+            raise KeyError(key)
         self.update_deadline_for_core(key)
-        return self.data[key].body
+        return self._decode(container.body)
 
     def __setitem__(self, key: KeyT, value: ValueT) -> None:
-        if key in self.data:
-            self.data[key].body = value
+        if (container := self._get_alive(key)) is not None:
+            container.body = self._encode(value)
             self.update_deadline_for_core(key)
         else:
-            self.data[key] = self.make_container(value)
+            self.data[key] = self.make_container(self._encode(value))
+            if self.lazy_expiry:
+                self._track(key)
+                self._writes += 1
+                if self._writes >= self.sweep_interval:
+                    self._writes = 0
+                    self.sweep()
 
     def __delitem__(self, key: KeyT) -> None:
         self.delete(key)
@@ -106,16 +252,16 @@ class DictCache(Cache, MutableMapping[KeyT, ValueT], Generic[KeyT, ValueT]):
         return self.data.keys()
 
     def values(self) -> ValuesViewForDictCache[ValueT]:
-        return ValuesViewForDictCache(self.data.values())
+        return ValuesViewForDictCache(self.data.values(), self._decode)
 
     def __contains__(self, key: KeyT) -> bool:
-        return key in self.data
+        return self._get_alive(key) is not None
 
     def __len__(self) -> int:
         return len(self.data)
 
     def items(self) -> ItemsViewForDictCache[KeyT, ValueT]:
-        return ItemsViewForDictCache(self.data.items())
+        return ItemsViewForDictCache(self.data.items(), self._decode)
 
     @overload
     def get(
@@ -133,12 +279,12 @@ class DictCache(Cache, MutableMapping[KeyT, ValueT], Generic[KeyT, ValueT]):
         default: DCgT | type[Undefined]
             = Undefined
     ) -> ValueT | DCgT:
-        if key not in self.data:
+        if (container := self._get_alive(key)) is None:
             if default == Undefined:
                 default = None # type: ignore
             return default # type: ignore
         self.update_deadline_for_core(key)
-        return self.data[key].body
+        return self._decode(container.body)
 
     def __eq__(self, other: DictCache) -> bool:
         return self.data == other.data
@@ -171,7 +317,7 @@ class DictCache(Cache, MutableMapping[KeyT, ValueT], Generic[KeyT, ValueT]):
         raise _TEDIOUS
 
     def clear(self) -> None:
-        for key in self.keys():
+        for key in list(self.keys()):
             self.delete(key)
 
     def update(self, *_: Any, **__: Any) -> None:
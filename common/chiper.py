@@ -1,48 +1,433 @@
 from __future__ import annotations
 
-__all__ = ("ChiperManager",)
+__all__ = (
+    "ChiperManager", "CryptResult", "TokenFormat", "AsyncReadable", "AsyncWritable",
+    "STREAM_MAGIC", "DEFAULT_STREAM_CHUNK_SIZE"
+)
 
-from cryptography.fernet import Fernet
+from typing import TYPE_CHECKING, TypeAlias, Literal, BinaryIO, Any
+from collections.abc import Iterable, Sequence
 
-from aiofiles import open as aioopen
+from itertools import islice
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from os import remove, urandom
+
+from .types_ import AsyncReadable, AsyncWritable
+
+# `cryptography`と`aiofiles`は読み込みに時間がかかるので、使う際に読み込む。
+if TYPE_CHECKING:
+    from cryptography.fernet import InvalidToken
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+    from concurrent.futures import Executor
+
+    from .utils import AsyncFuncIO
+
+
+CryptResult: TypeAlias = str | Exception
+"`.ChiperManager.encrypt_many`などの結果の一つです。失敗した場合はエラーが入ります。"
+TokenFormat: TypeAlias = Literal["fernet", "aesgcm", "chacha20"]
+"`.ChiperManager`で暗号化する際のトークンの形式です。"
+Buffer: TypeAlias = bytes | bytearray | memoryview
+
+
+_TOKEN_VERSIONS: dict[TokenFormat, int] = {"aesgcm": 0xA1, "chacha20": 0xA2}
+"AEADの形式のトークンの先頭一バイトです。Fernetのトークンの先頭（`g`）とは被りません。"
+_NONCE_SIZE = 12
+
+
+def _import_exceptions() -> None:
+    """`cryptography`の例外をモジュールの変数に読み込みます。`.ChiperManager`の初期化の際に呼ばれます。
+    復号化の度に`import`文を実行しないように、モジュールの変数にしています。"""
+    global InvalidToken, InvalidTag
+    from cryptography.fernet import InvalidToken
+    from cryptography.exceptions import InvalidTag
+
+
+def _crypt_chunk(
+    manager: ChiperManager, mode: Literal["encrypt", "decrypt"],
+    chunk: Sequence[str | bytes]
+) -> list[CryptResult]:
+    """複数のデータを順番に暗号化または復号化します。失敗したものはエラーをそのまま結果とします。
+    プロセスプールでも動かせるように、モジュールの関数にしています。"""
+    method = manager.encrypt_bytes_to_str if mode == "encrypt" \
+        else manager.decrypt_bytes_to_str
+    results = list[CryptResult]()
+    for item in chunk:
+        try:
+            results.append(method(
+                item.encode() if isinstance(item, str) else item
+            ))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _chunked(
+    items: Iterable[str | bytes],
+    chunk_size: int
+) -> list[list[str | bytes]]:
+    iterator = iter(items)
+    return list(iter(lambda: list(islice(iterator, chunk_size)), []))
+
+
+STREAM_MAGIC = b"RXS1"
+"ストリーム暗号化の形式の先頭に付けられるバイト列です。"
+_STREAM_HEADER_SIZE = len(STREAM_MAGIC) + 4 + 7
+_STREAM_TAG_SIZE = 16
+_STREAM_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+DEFAULT_STREAM_CHUNK_SIZE = 64 * 1024
+"ストリーム暗号化で一度に暗号化する平文の大きさのデフォルトです。"
+
+
+class _StreamSealer:
+    """ストリーム暗号化の形式で、塊を一つずつ暗号化するためのものです。
+    形式はヘッダ（`STREAM_MAGIC`、平文の塊の大きさ、7バイトのランダムなnonceの接頭辞）と、暗号化された塊の連続です。
+    各塊はAES-GCMで暗号化され、nonceには塊の番号と最後の塊かどうかのフラグが含まれ、ヘッダは追加認証データになります。
+    これにより、各塊は独立して検証でき、塊の並べ替えや削除、途中での切り詰めが検出できます。
+    最後の塊は必ず`chunk_size`より短くなります。（平文が割り切れる場合は空の塊が最後に付きます。）"""
+
+    def __init__(self, aead: AESGCM, chunk_size: int) -> None:
+        if not 0 < chunk_size <= _STREAM_MAX_CHUNK_SIZE:
+            raise ValueError("塊の大きさが不正です。")
+        self.aead, self.chunk_size, self.counter = aead, chunk_size, 0
+        self.header = STREAM_MAGIC + chunk_size.to_bytes(4, "big") + urandom(7)
+
+    def seal(self, chunk: bytes) -> bytes:
+        "塊を暗号化します。`chunk_size`より短い塊は最後の塊として扱います。"
+        last = len(chunk) < self.chunk_size
+        nonce = self.header[-7:] + self.counter.to_bytes(4, "big") + (b"\x01" if last else b"\x00")
+        self.counter += 1
+        return self.aead.encrypt(nonce, chunk, self.header)
+
+
+class _StreamOpener:
+    "`._StreamSealer`で暗号化されたものを塊一つずつ復号化するためのものです。"
+
+    def __init__(self, aead: AESGCM, header: bytes) -> None:
+        if len(header) != _STREAM_HEADER_SIZE or not header.startswith(STREAM_MAGIC):
+            raise InvalidToken
+        self.aead, self.header, self.counter = aead, header, 0
+        self.chunk_size = int.from_bytes(header[4:8], "big")
+        if not 0 < self.chunk_size <= _STREAM_MAX_CHUNK_SIZE:
+            raise InvalidToken
+        self.sealed_size = self.chunk_size + _STREAM_TAG_SIZE
+        self.finished = False
+
+    def open(self, sealed: bytes) -> bytes:
+        "暗号化された塊を復号化します。改竄や並べ替え、最後の塊の後のデータは`InvalidToken`になります。"
+        if self.finished:
+            raise InvalidToken
+        last = len(sealed) < self.sealed_size
+        nonce = self.header[-7:] + self.counter.to_bytes(4, "big") + (b"\x01" if last else b"\x00")
+        try:
+            chunk = self.aead.decrypt(nonce, sealed, self.header)
+        except InvalidTag:
+            raise InvalidToken
+        self.counter += 1
+        self.finished = last
+        return chunk
+
+    def close(self) -> None:
+        "全て読み終えた後に呼んでください。最後の塊がない場合（切り詰められている場合）は`InvalidToken`になります。"
+        if not self.finished:
+            raise InvalidToken
+
+
+def _read_exact(src: BinaryIO, size: int) -> bytes:
+    "EOFでない限り、必ず`size`バイト読み込みます。"
+    data = src.read(size)
+    while data and len(data) < size and (more := src.read(size - len(data))):
+        data += more
+    return data
+
+async def _read_exact_async(src: AsyncReadable, size: int) -> bytes:
+    "`._read_exact`の非同期版です。"
+    data = await src.read(size)
+    while data and len(data) < size and (more := await src.read(size - len(data))):
+        data += more
+    return data
 
 
 class ChiperManager:
-    "暗号を作るためのクラスです。"
+    """暗号を作るためのクラスです。
+
+    `token_format`を`"aesgcm"`か`"chacha20"`にすると、暗号化の際にFernetの代わりにAEADによる形式のトークンを作ります。
+    その形式は、形式を表す一バイトと12バイトのnonce、暗号文と認証タグを繋げたものです。（文字列の場合はそれをURLセーフなBase64にしたものです。）
+    Fernetより処理が軽く、`.seal`と`.unseal`ではBase64も挟みません。
+    復号化の際はトークンから形式を判別するので、移行中も既存のFernetのトークンはそのまま復号化できます。"""
 
-    def __init__(self, key: bytes):
+    def __init__(self, key: bytes, token_format: TokenFormat = "fernet"):
+        from cryptography.fernet import Fernet
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+        _import_exceptions()
+
+        self.key, self.token_format = key, token_format
         self.fernet = Fernet(key)
+        self.stream_aead = AESGCM(self.derive_key(key, b"rextlib-stream-v1"))
+        "ストリーム暗号化に使うAES-GCMです。鍵はFernetの鍵から導出されます。"
+        self.token_aeads: dict[int, AESGCM | ChaCha20Poly1305] = {
+            _TOKEN_VERSIONS["aesgcm"]: AESGCM(
+                self.derive_key(key, b"rextlib-token-aesgcm-v1")),
+            _TOKEN_VERSIONS["chacha20"]: ChaCha20Poly1305(
+                self.derive_key(key, b"rextlib-token-chacha20-v1"))
+        }
+        "AEADの形式のトークンに使う暗号です。鍵はFernetの鍵から導出されます。"
+
+    def __reduce__(self) -> tuple[type[ChiperManager], tuple[bytes, TokenFormat]]:
+        return self.__class__, (self.key, self.token_format)
+
+    @staticmethod
+    def derive_key(key: bytes, info: bytes, length: int = 32) -> bytes:
+        "Fernetの鍵から、HKDFで用途ごとの別の鍵を導出します。"
+        from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+        from cryptography.hazmat.primitives.hashes import SHA256
+
+        return HKDF(SHA256(), length, None, info).derive(urlsafe_b64decode(key))
 
     @classmethod
-    def from_key_file(cls, file_path: str) -> ChiperManager:
+    def from_key_file(cls, file_path: str, *args: Any, **kwargs: Any) -> ChiperManager:
         with open(file_path, "rb") as f:
-            return cls(f.read())
+            return cls(f.read(), *args, **kwargs)
 
     @classmethod
-    async def from_key_file_async(cls, file_path: str) -> ChiperManager:
+    async def from_key_file_async(
+        cls, file_path: str,
+        *args: Any, **kwargs: Any
+    ) -> ChiperManager:
+        from aiofiles import open as aioopen
+
         async with aioopen(file_path, "rb") as f:
-            return cls(await f.read())
+            return cls(await f.read(), *args, **kwargs)
+
+    def seal(
+        self, data: Buffer,
+        token_format: TokenFormat | None = None
+    ) -> bytes:
+        """bytesのまま暗号化して、Base64にしていないトークンを返します。`memoryview`も渡せます。
+        `token_format`を省略した場合は`.token_format`が使われます。
+        Fernetの場合はFernetのトークンがそのまま返されます。"""
+        token_format = token_format or self.token_format
+        if token_format == "fernet":
+            return self.fernet.encrypt(bytes(data))
+        version = _TOKEN_VERSIONS[token_format]
+        nonce = urandom(_NONCE_SIZE)
+        return b"".join((
+            version.to_bytes(1, "big"), nonce,
+            self.token_aeads[version].encrypt(nonce, data, None)
+        ))
+
+    def unseal(self, token: Buffer) -> bytes:
+        """`.seal`で作ったトークンを復号化します。Fernetのトークンも渡せます。
+        改竄されている場合などは`InvalidToken`を発生させます。"""
+        if not token:
+            raise InvalidToken
+        if (aead := self.token_aeads.get(token[0])) is None:
+            return self.fernet.decrypt(bytes(token))
+        view = memoryview(token)
+        try:
+            return aead.decrypt(view[1:_NONCE_SIZE+1], view[_NONCE_SIZE+1:], None)
+        except InvalidTag:
+            raise InvalidToken
+
+    def _encrypt(self, data: Buffer) -> bytes:
+        "暗号化してBase64のトークンにします。"
+        token = self.seal(data)
+        return token if self.token_format == "fernet" else urlsafe_b64encode(token)
+
+    def _decrypt(self, token: Buffer) -> bytes:
+        "Base64のトークンを、形式を判別して復号化します。"
+        if token[:1] == b"g":
+            return self.fernet.decrypt(bytes(token))
+        try:
+            raw = urlsafe_b64decode(token)
+        except ValueError:
+            raise InvalidToken
+        return self.unseal(raw)
 
     def encrypt(self, text: str) -> str:
         "暗号化します。"
-        return self.fernet.encrypt(text.encode()).decode()
+        return self._encrypt(text.encode()).decode()
 
     def encrypt_bytes_to_str(self, text: bytes) -> str:
         "bytesを暗号化してstrにします。"
-        return self.fernet.encrypt(text).decode()
+        return self._encrypt(text).decode()
 
     def encrypt_str_to_bytes(self, text: str) -> bytes:
         "strを暗号化してbytesにします。"
-        return self.fernet.encrypt(text.encode())
+        return self._encrypt(text.encode())
 
     def decrypt(self, text: str) -> str:
         "復号化します。"
-        return self.fernet.decrypt(text.encode()).decode()
+        return self._decrypt(text.encode()).decode()
 
     def decrypt_str_to_bytes(self, text: str) -> bytes:
         "strを復号化してbytesにします。"
-        return self.fernet.decrypt(text.encode())
+        return self._decrypt(text.encode())
 
     def decrypt_bytes_to_str(self, text: bytes) -> str:
         "bytesを復号化してstrにします。"
-        return self.fernet.decrypt(text).decode()
\ No newline at end of file
+        return self._decrypt(text).decode()
+
+    def _crypt_many(
+        self, mode: Literal["encrypt", "decrypt"],
+        texts: Iterable[str | bytes],
+        executor: Executor | None, chunk_size: int
+    ) -> list[CryptResult]:
+        chunks = _chunked(texts, chunk_size)
+        if executor is None:
+            results = [_crypt_chunk(self, mode, chunk) for chunk in chunks]
+        else:
+            results = [future.result() for future in [
+                executor.submit(_crypt_chunk, self, mode, chunk)
+                for chunk in chunks
+            ]]
+        return [result for chunk in results for result in chunk]
+
+    async def _crypt_many_async(
+        self, mode: Literal["encrypt", "decrypt"],
+        texts: Iterable[str | bytes],
+        executor: Executor | AsyncFuncIO | None,
+        chunk_size: int
+    ) -> list[CryptResult]:
+        from concurrent.futures import Executor
+        from asyncio import gather, get_running_loop
+
+        chunks = _chunked(texts, chunk_size)
+        if executor is None or isinstance(executor, Executor):
+            loop = get_running_loop()
+            results = await gather(*(
+                loop.run_in_executor(executor, _crypt_chunk, self, mode, chunk)
+                for chunk in chunks
+            ))
+        else:
+            results = await gather(*(
+                executor.run(_crypt_chunk, self, mode, chunk)
+                for chunk in chunks
+            ))
+        return [result for chunk in results for result in chunk]
+
+    def encrypt_many(
+        self, texts: Iterable[str | bytes],
+        executor: Executor | None = None,
+        chunk_size: int = 256
+    ) -> list[CryptResult]:
+        """複数のデータをまとめて暗号化します。
+        `executor`を渡した場合は、`chunk_size`個ずつに分けてそのExecutorで並列に処理します。
+        結果は渡された順番通りで、暗号化に失敗したものは結果がエラーになります。"""
+        return self._crypt_many("encrypt", texts, executor, chunk_size)
+
+    def decrypt_many(
+        self, texts: Iterable[str | bytes],
+        executor: Executor | None = None,
+        chunk_size: int = 256
+    ) -> list[CryptResult]:
+        """複数のデータをまとめて復号化します。
+        不正なトークンがあっても全体は中断せず、そのトークンの結果が`InvalidToken`などのエラーになります。
+        その他は`.encrypt_many`と同じです。"""
+        return self._crypt_many("decrypt", texts, executor, chunk_size)
+
+    async def encrypt_many_async(
+        self, texts: Iterable[str | bytes],
+        executor: Executor | AsyncFuncIO | None = None,
+        chunk_size: int = 256
+    ) -> list[CryptResult]:
+        """`.encrypt_many`の非同期版です。イベントループをブロックしません。
+        `executor`には`.AsyncFuncIO`も渡せます。省略した場合はイベントループのデフォルトのExecutorを使います。
+        CPUを使い切りたい場合は`ProcessPoolExecutor`を渡してください。"""
+        return await self._crypt_many_async("encrypt", texts, executor, chunk_size)
+
+    async def decrypt_many_async(
+        self, texts: Iterable[str | bytes],
+        executor: Executor | AsyncFuncIO | None = None,
+        chunk_size: int = 256
+    ) -> list[CryptResult]:
+        "`.decrypt_many`の非同期版です。引数は`.encrypt_many_async`と同じです。"
+        return await self._crypt_many_async("decrypt", texts, executor, chunk_size)
+
+    def encrypt_stream(
+        self, src: BinaryIO, dst: BinaryIO,
+        chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE
+    ) -> None:
+        """`src`から読み込んだものを`chunk_size`バイトずつ暗号化して`dst`に書き込みます。
+        Fernetと違い全体をメモリに載せないので、ファイルの大きさに関わらずメモリ使用量は一定です。
+        形式については`._StreamSealer`を参照してください。"""
+        sealer = _StreamSealer(self.stream_aead, chunk_size)
+        dst.write(sealer.header)
+        while True:
+            chunk = _read_exact(src, chunk_size)
+            dst.write(sealer.seal(chunk))
+            if len(chunk) < chunk_size:
+                break
+
+    def decrypt_stream(self, src: BinaryIO, dst: BinaryIO) -> None:
+        """`.encrypt_stream`で暗号化されたものを復号化して`dst`に書き込みます。
+        改竄や塊の並べ替え、切り詰めを検出した場合は`InvalidToken`を発生させます。
+        その場合でも、それまでに復号化できた分は`dst`に書き込まれているので、捨ててください。"""
+        opener = _StreamOpener(self.stream_aead, _read_exact(src, _STREAM_HEADER_SIZE))
+        while sealed := _read_exact(src, opener.sealed_size):
+            dst.write(opener.open(sealed))
+        opener.close()
+
+    async def encrypt_stream_async(
+        self, src: AsyncReadable, dst: AsyncWritable,
+        chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE
+    ) -> None:
+        "`.encrypt_stream`の非同期版です。`aiofiles`で開いたファイルなどを渡せます。"
+        sealer = _StreamSealer(self.stream_aead, chunk_size)
+        await dst.write(sealer.header)
+        while True:
+            chunk = await _read_exact_async(src, chunk_size)
+            await dst.write(sealer.seal(chunk))
+            if len(chunk) < chunk_size:
+                break
+
+    async def decrypt_stream_async(self, src: AsyncReadable, dst: AsyncWritable) -> None:
+        "`.decrypt_stream`の非同期版です。"
+        opener = _StreamOpener(
+            self.stream_aead,
+            await _read_exact_async(src, _STREAM_HEADER_SIZE)
+        )
+        while sealed := await _read_exact_async(src, opener.sealed_size):
+            await dst.write(opener.open(sealed))
+        opener.close()
+
+    def encrypt_file(
+        self, src_path: str, dst_path: str,
+        chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE
+    ) -> None:
+        "ファイルを`.encrypt_stream`で暗号化して別のファイルに保存します。"
+        with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+            self.encrypt_stream(src, dst, chunk_size)
+
+    def decrypt_file(self, src_path: str, dst_path: str) -> None:
+        "`.encrypt_file`で暗号化したファイルを復号化します。失敗した場合、書きかけの`dst_path`は削除されます。"
+        try:
+            with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+                self.decrypt_stream(src, dst)
+        except InvalidToken:
+            remove(dst_path)
+            raise
+
+    async def encrypt_file_async(
+        self, src_path: str, dst_path: str,
+        chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE
+    ) -> None:
+        "`.encrypt_file`の非同期版です。"
+        from aiofiles import open as aioopen
+
+        async with aioopen(src_path, "rb") as src, aioopen(dst_path, "wb") as dst:
+            await self.encrypt_stream_async(src, dst, chunk_size)
+
+    async def decrypt_file_async(self, src_path: str, dst_path: str) -> None:
+        "`.decrypt_file`の非同期版です。"
+        from aiofiles import open as aioopen
+
+        try:
+            async with aioopen(src_path, "rb") as src, aioopen(dst_path, "wb") as dst:
+                await self.decrypt_stream_async(src, dst)
+        except InvalidToken:
+            remove(dst_path)
+            raise
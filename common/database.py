@@ -1,5 +1,7 @@
-from typing import TypeVar, Self, Any
-from collections.abc import AsyncIterator, Callable
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, TypeVar, Self, Any
+from collections.abc import AsyncIterator, Awaitable, Callable, Sequence
 
 from inspect import iscoroutinefunction, isasyncgenfunction, getsource, getfile
 
@@ -7,10 +9,14 @@ from warnings import filterwarnings
 from dataclasses import dataclass
 from functools import wraps
 
-from aiomysql import Pool, Cursor, create_pool
+from math import ceil
 
 from .config import Databases as DatabasesConfig
 
+# 起動を速くするため、aiomysqlは使う時に読み込む。
+if TYPE_CHECKING:
+    from aiomysql import Pool, Cursor
+
 
 filterwarnings('ignore', module=r"aiomysql")
 cursor: Cursor
@@ -32,6 +38,113 @@ async def fetchstep(
         now += cycle
 
 
+async def make_boundaries(
+    pool: Pool, table: str, key: str,
+    partitions: int
+) -> list[int]:
+    """整数の列`key`の最小値と最大値から、テーブルを`partitions`個の範囲に分けるための境界を作ります。
+    返り値は`.fetchrange`の`boundaries`に渡せます。テーブルが空の場合は空のリストを返します。"""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM {table};")
+            minimum, maximum = (await cursor.fetchone())[:2]
+    if minimum is None:
+        return []
+    step = max(1, ceil((maximum + 1 - minimum) / partitions))
+    return [*range(minimum, maximum + 1, step), maximum + 1]
+
+
+_END = object()
+class _ScanError:
+    "`.fetchrange`のワーカーで発生したエラーを読み込む側に渡すためのものです。"
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+
+
+async def _scan_range(
+    pool: Pool, sql: str, args: tuple,
+    cycle: int, cursor_classes: tuple[type[Cursor], ...],
+    put: Callable[[Any], Awaitable[None]]
+) -> None:
+    "一つの範囲を一つの接続で`cycle`行ずつ読み込み、`put`に渡します。"
+    async with pool.acquire() as conn:
+        async with conn.cursor(*cursor_classes) as cursor:
+            now = 0
+            while True:
+                await cursor.execute(sql.replace(";", f" LIMIT {now}, {cycle};"), args)
+                if rows := await cursor.fetchall():
+                    await put(rows)
+                if len(rows) < cycle:
+                    break
+                now += cycle
+
+
+async def fetchrange(
+    pool: Pool, sql: str,
+    boundaries: Sequence[Any] | None = None, *,
+    table: str | None = None, key: str | None = None,
+    args: tuple = (), connections: int = 4,
+    partitions: int | None = None, cycle: int = 500,
+    ordered: bool = False, buffer: int = 2,
+    cursor_classes: tuple[type[Cursor], ...] = ()
+) -> AsyncIterator[Any]:
+    """インデックスのある列の範囲でクエリを分割し、複数の接続で並列に読み込みます。
+    大きなテーブルを丸ごと読み込む際に、一つの接続の往復の遅延に律速されないようにするためのものです。
+    `pool`には基本的に`.DatabasePools.read`を渡してください。
+
+    `sql`の最後の二つのプレースホルダには、範囲の下限（含む）と上限（含まない）が`args`の後に渡されます。
+    例えば`"SELECT * FROM Test WHERE id >= %s AND id < %s ORDER BY id;"`のようにします。
+    範囲は`boundaries`の隣り合う値の組です。省略した場合は`table`と`key`から`.make_boundaries`で作ります。
+
+    各範囲は`cycle`行ずつ読み込まれ、最大`connections`個の接続で同時に処理されます。
+    読み込んだ塊は`buffer`個までバッファされ、消費されている間に次の塊を先読みします。
+    `ordered`が`True`の場合は範囲の順番通りに、そうでない場合は読み込めた順に行を返します。"""
+    from asyncio import Queue, create_task, gather
+
+    if boundaries is None:
+        if table is None or key is None:
+            raise ValueError("`boundaries`を省略する場合は`table`と`key`を指定してください。")
+        boundaries = await make_boundaries(pool, table, key, partitions or connections)
+    ranges = list(enumerate(zip(boundaries, boundaries[1:])))
+    if not ranges:
+        return
+
+    queues = [Queue[Any](buffer) for _ in ranges] if ordered \
+        else [Queue[Any](buffer * connections)]
+    pending = iter(ranges)
+
+    async def worker() -> None:
+        for index, (lower, upper) in pending:
+            queue = queues[index if ordered else 0]
+            try:
+                await _scan_range(
+                    pool, sql, (*args, lower, upper),
+                    cycle, cursor_classes, queue.put
+                )
+            except Exception as e:
+                await queue.put(_ScanError(e))
+                return
+            if ordered:
+                await queue.put(_END)
+        if not ordered:
+            await queues[0].put(_END)
+
+    tasks = [create_task(worker()) for _ in range(min(connections, len(ranges)))]
+    try:
+        # 順不同の場合は、一つのキューからワーカーの数だけ`_END`を受け取るまで読む。
+        for queue in queues if ordered else queues * len(tasks):
+            while (item := await queue.get()) is not _END:
+                if isinstance(item, _ScanError):
+                    raise item.error
+                for row in item:
+                    yield row
+    finally:
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
+
+
 CaT = TypeVar("CaT")
 class DatabaseManager:
     "データベースを簡単に処理するためのクラスです。"
@@ -39,65 +152,102 @@ class DatabaseManager:
     db: Pool
 
     def __init_subclass__(cls) -> None:
+        # ソースの書き換え（コンパイル）は重いので、初めて呼ばれた時に行う。
+        # ただし、ソースはファイルが後で書き換えられても読み込んだ時のものを使うように、ここで取得しておく。
         for key, value in list(cls.__dict__.items()):
             if ((gen := isasyncgenfunction(value)) or iscoroutinefunction(value)) \
                     and not getattr(value, "__dm_ignore__", False):
-                # `cursor`の引数を増設する。
-                l = {}
-                source = getsource(value).replace("self",  "self, cursor", 1)
-                index = source.find("@")
-                if index == -1:
-                    index = source.find("async def ")
-
-                if_count = int(index / 4)
-                source = "{}{}".format(
-                    "\n" * (value.__code__.co_firstlineno - if_count - 1), "\n".join((
-                    "\n".join(f"{'    '*i}if True:" for i in range(if_count)), source
-                )))
-                exec(compile(source, getfile(value), "exec"), value.__globals__, l)
-
-                # 新しい関数を作る。
-                cursors = getattr(value, "__dm_cursor_classes__") if \
-                    hasattr(value, "__dm_cursor_classes__") else ()
+                source = getsource(value)
                 if gen:
-                    @wraps(l[key])
-                    async def _new( # type: ignore
-                        self: DatabaseManager, *args,
-                        __dm_func__=l[key],
-                        __dm_cursors__=cursors,
-                        **kwargs
+                    @wraps(value)
+                    async def _lazy( # type: ignore
+                        self: DatabaseManager, *args: Any,
+                        __dm_key__: str = key, __dm_value__: Any = value,
+                        __dm_source__: str = source, **kwargs: Any
+                    ) -> Any:
+                        async for data in cls._dm_rewrite(
+                            __dm_key__, __dm_value__, __dm_source__, True
+                        )(self, *args, **kwargs):
+                            yield data
+                else:
+                    @wraps(value)
+                    async def _lazy(
+                        self: DatabaseManager, *args: Any,
+                        __dm_key__: str = key, __dm_value__: Any = value,
+                        __dm_source__: str = source, **kwargs: Any
+                    ) -> Any:
+                        return await cls._dm_rewrite(
+                            __dm_key__, __dm_value__, __dm_source__, False
+                        )(self, *args, **kwargs)
+                setattr(cls, key, _lazy)
+
+    @classmethod
+    def _dm_rewrite(cls, key: str, value: Any, source: str, gen: bool) -> Any:
+        "メソッドのソースを書き換えて`cursor`の引数を増やし、カーソルを用意するように包んだものに置き換えます。"
+        if (current := cls.__dict__.get(key)) is not None \
+                and getattr(current, "__dm_rewritten__", False):
+            return current
+
+        # `cursor`の引数を増設する。
+        l = {}
+        source = source.replace("self",  "self, cursor", 1)
+        index = source.find("@")
+        if index == -1:
+            index = source.find("async def ")
+
+        if_count = int(index / 4)
+        source = "{}{}".format(
+            "\n" * (value.__code__.co_firstlineno - if_count - 1), "\n".join((
+            "\n".join(f"{'    '*i}if True:" for i in range(if_count)), source
+        )))
+        exec(compile(
+            source, getfile(value), "exec", dont_inherit=True
+        ), value.__globals__, l)
+
+        # 新しい関数を作る。
+        cursors = getattr(value, "__dm_cursor_classes__") if \
+            hasattr(value, "__dm_cursor_classes__") else ()
+        if gen:
+            @wraps(l[key])
+            async def _new( # type: ignore
+                self: DatabaseManager, *args,
+                __dm_func__=l[key],
+                __dm_cursors__=cursors,
+                **kwargs
+            ):
+                if "cursor" in kwargs:
+                    async for data in __dm_func__(
+                        self, kwargs.pop("cursor"),
+                        *args, **kwargs
                     ):
-                        if "cursor" in kwargs:
+                        yield data
+                else:
+                    async with self.db.acquire() as conn:
+                        async with conn.cursor(*__dm_cursors__) as cursor:
                             async for data in __dm_func__(
-                                self, kwargs.pop("cursor"),
-                                *args, **kwargs
+                                self, cursor, *args, **kwargs
                             ):
                                 yield data
-                        else:
-                            async with self.db.acquire() as conn:
-                                async with conn.cursor(*__dm_cursors__) as cursor:
-                                    async for data in __dm_func__(
-                                        self, cursor, *args, **kwargs
-                                    ):
-                                        yield data
+        else:
+            @wraps(l[key])
+            async def _new(
+                self: DatabaseManager, *args,
+                __dm_func__=l[key],
+                __dm_cursors__=cursors,
+                **kwargs
+            ):
+                if "cursor" in kwargs:
+                    return await __dm_func__(
+                        self, kwargs.pop("cursor"),
+                        *args, **kwargs
+                    )
                 else:
-                    @wraps(l[key])
-                    async def _new(
-                        self: DatabaseManager, *args,
-                        __dm_func__=l[key],
-                        __dm_cursors__=cursors,
-                        **kwargs
-                    ):
-                        if "cursor" in kwargs:
-                            return await __dm_func__(
-                                self, kwargs.pop("cursor"),
-                                *args, **kwargs
-                            )
-                        else:
-                            async with self.db.acquire() as conn:
-                                async with conn.cursor(*__dm_cursors__) as cursor:
-                                    return await __dm_func__(self, cursor, *args, **kwargs)
-                setattr(cls, key, _new)
+                    async with self.db.acquire() as conn:
+                        async with conn.cursor(*__dm_cursors__) as cursor:
+                            return await __dm_func__(self, cursor, *args, **kwargs)
+        setattr(_new, "__dm_rewritten__", True)
+        setattr(cls, key, _new)
+        return _new
 
     @staticmethod
     def set_to_ignore(func: CaT) -> CaT:
@@ -125,6 +275,8 @@ class DatabasePools:
     @classmethod
     async def from_config(cls, config: DatabasesConfig) -> Self:
         "データベースの設定からこのクラスのインスタンスを作ります。"
+        from aiomysql import create_pool
+
         self = cls(None, None) # type: ignore
         self.write = await create_pool(**config["write"])
         self._read_is_write = "read" in config
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+__all__ = (
+    "RowsSource", "FakeCursor", "FakeConnection", "FakePool", "create_fake_pool"
+)
+
+from typing import TypeAlias, Generic, TypeVar, Any
+from collections.abc import Awaitable, Callable, Generator, Sequence
+
+from asyncio import Semaphore, sleep
+from re import IGNORECASE, compile as re_compile
+
+
+RowsSource: TypeAlias = Sequence[Any] | Callable[[str, Any], Sequence[Any]]
+"`.FakeCursor`が返す行、またはSQLと引数から行を作る関数の型です。"
+_LIMIT = re_compile(r"\sLIMIT\s+(\d+)\s*(?:,\s*(\d+))?\s*;?\s*$", IGNORECASE)
+
+
+CmT = TypeVar("CmT")
+class _ContextManager(Generic[CmT]):
+    "`await`と`async with`の両方で使えるようにするためのものです。aiomysqlの同名のクラスの真似です。"
+
+    def __init__(
+        self, coro: Awaitable[CmT],
+        on_exit: Callable[[CmT], Awaitable[None]]
+    ) -> None:
+        self._coro, self._on_exit = coro, on_exit
+        self._obj: CmT | None = None
+
+    def __await__(self) -> Generator[Any, None, CmT]:
+        return self._coro.__await__()
+
+    async def __aenter__(self) -> CmT:
+        self._obj = await self._coro
+        return self._obj
+
+    async def __aexit__(self, *_: Any) -> None:
+        assert self._obj is not None
+        await self._on_exit(self._obj)
+        self._obj = None
+
+
+class FakeCursor:
+    """データベースに接続せずに動く`aiomysql.Cursor`の代わりです。
+    `execute`では`.FakeConnection.pool`の遅延だけ待ち、設定された行を結果とします。
+    SQLの末尾に`LIMIT`がある場合は、その範囲で行を切り取ります。（`.fetchstep`用です。）"""
+
+    def __init__(self, connection: FakeConnection, *classes: type) -> None:
+        self.connection, self.classes = connection, classes
+        self.executed = list[tuple[str, Any]]()
+        self.rowcount, self.lastrowid, self.closed = -1, 0, False
+        self._rows: Sequence[Any] = ()
+        self._position = 0
+
+    async def execute(self, query: str, args: Any = None) -> int:
+        "SQLを実行したことにします。"
+        pool = self.connection.pool
+        if pool.latency:
+            await sleep(pool.latency)
+        self.executed.append((query, args))
+        pool.execute_count += 1
+
+        rows = pool.rows(query, args) if callable(pool.rows) else pool.rows
+        if pool.apply_limit and (match := _LIMIT.search(query)) is not None:
+            if match.group(2) is None:
+                offset, count = 0, int(match.group(1))
+            else:
+                offset, count = int(match.group(1)), int(match.group(2))
+            rows = rows[offset:offset+count]
+
+        self._rows, self._position = rows, 0
+        self.rowcount = len(rows)
+        return self.rowcount
+
+    async def executemany(self, query: str, args: Sequence[Any]) -> int:
+        "`execute`を引数の数だけ実行したことにします。"
+        count = 0
+        for arg in args:
+            count += await self.execute(query, arg)
+        self.rowcount = count
+        return count
+
+    async def fetchone(self) -> Any | None:
+        if self._position >= len(self._rows):
+            return None
+        self._position += 1
+        return self._rows[self._position-1]
+
+    async def fetchmany(self, size: int | None = None) -> Sequence[Any]:
+        end = self._position + (size or 1)
+        rows = self._rows[self._position:end]
+        self._position = min(end, len(self._rows))
+        return tuple(rows)
+
+    async def fetchall(self) -> Sequence[Any]:
+        rows = self._rows[self._position:]
+        self._position = len(self._rows)
+        return tuple(rows)
+
+    async def close(self) -> None:
+        self.closed = True
+
+    async def __aenter__(self) -> FakeCursor:
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.close()
+
+
+class FakeConnection:
+    "`aiomysql.Connection`の代わりです。"
+
+    def __init__(self, pool: FakePool) -> None:
+        self.pool = pool
+
+    def cursor(self, *classes: type) -> _ContextManager[FakeCursor]:
+        "カーソルを作ります。"
+        async def _make() -> FakeCursor:
+            self.pool.cursor_count += 1
+            return FakeCursor(self, *classes)
+        async def _close(cursor: FakeCursor) -> None:
+            await cursor.close()
+        return _ContextManager(_make(), _close)
+
+    async def commit(self) -> None: ...
+    async def rollback(self) -> None: ...
+
+
+class FakePool:
+    """データベースに接続せずに動く`aiomysql.Pool`の代わりです。
+    `.DatabaseManager`や`.fetchstep`、`.DatabasePools`のベンチマークやテストに使うことを想定しています。
+
+    Args:
+        rows: `execute`の結果となる行です。SQLと引数を受け取り行を返す関数も渡せます。
+        latency: `execute`一回あたりに擬似的に待つ秒数です。
+        acquire_latency: 接続を取得する際に擬似的に待つ秒数です。
+        maxsize: 同時に貸し出せる接続の数です。
+        apply_limit: SQLの末尾の`LIMIT`に従って行を切り取るかどうかです。"""
+
+    def __init__(
+        self, rows: RowsSource = (), *,
+        latency: float = 0., acquire_latency: float = 0.,
+        minsize: int = 1, maxsize: int = 10,
+        apply_limit: bool = True
+    ) -> None:
+        self.rows, self.latency, self.acquire_latency = rows, latency, acquire_latency
+        self.minsize, self.maxsize, self.apply_limit = minsize, maxsize, apply_limit
+        self.acquire_count = self.cursor_count = self.execute_count = 0
+        self._semaphore = Semaphore(maxsize)
+        self._used = 0
+        self._closed = False
+
+    @property
+    def size(self) -> int:
+        return self.maxsize
+
+    @property
+    def freesize(self) -> int:
+        return self.maxsize - self._used
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def acquire(self) -> _ContextManager[FakeConnection]:
+        "接続を取得します。"
+        return _ContextManager(self._acquire(), self.release)
+
+    async def _acquire(self) -> FakeConnection:
+        if self._closed:
+            raise RuntimeError("プールは既に閉じられています。")
+        await self._semaphore.acquire()
+        if self.acquire_latency:
+            try:
+                await sleep(self.acquire_latency)
+            except BaseException:
+                self._semaphore.release()
+                raise
+        self._used += 1
+        self.acquire_count += 1
+        return FakeConnection(self)
+
+    async def release(self, _: FakeConnection) -> None:
+        "接続を返却します。"
+        self._used -= 1
+        self._semaphore.release()
+
+    def close(self) -> None:
+        self._closed = True
+
+    async def wait_closed(self) -> None: ...
+
+
+async def create_fake_pool(*args: Any, **kwargs: Any) -> FakePool:
+    "`aiomysql.create_pool`の代わりです。引数は`.FakePool`に渡されます。"
+    return FakePool(*args, **kwargs)
@@ -1,6 +1,29 @@
-__all__ = ("get_hash", "get_file_hash")
+from __future__ import annotations
 
-from hashlib import sha256
+__all__ = (
+    "get_hash", "get_file_hash", "get_file_hash_async", "hash_files",
+    "hash_files_async", "MMAP_THRESHOLD", "ManifestEntry", "ManifestChanges",
+    "HashManifest"
+)
+
+from typing import TYPE_CHECKING, NamedTuple, Self
+from collections.abc import Iterable, Iterator
+
+from dataclasses import dataclass, field
+from os import PathLike, DirEntry, fspath, fstat, scandir, replace
+from os.path import join
+
+from hashlib import sha256, file_digest
+from mmap import mmap, ACCESS_READ
+
+from orjson import dumps, loads
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+
+MMAP_THRESHOLD = 8 * 1024 * 1024
+"この大きさ以上のファイルは`mmap`で読み込んでハッシュを計算します。"
 
 
 def get_hash(data: bytes) -> str:
@@ -8,7 +31,190 @@ def get_hash(data: bytes) -> str:
     return sha256(data).hexdigest()
 
 
-def get_file_hash(file_path: str) -> str:
-    "ファイルのハッシュを取得します。"
+def get_file_hash(
+    file_path: str | PathLike[str],
+    mmap_threshold: int | None = MMAP_THRESHOLD
+) -> str:
+    """ファイルのハッシュを取得します。
+    ファイル全体をメモリに読み込まず、少しずつ読み込みながら計算します。
+    `mmap_threshold`以上の大きさのファイルは`mmap`を使い、コピーせずに一度で計算します。（`None`で無効になります。）"""
     with open(file_path, "rb") as f:
-        return get_hash(f.read())
\ No newline at end of file
+        if mmap_threshold is not None and fstat(f.fileno()).st_size >= max(mmap_threshold, 1):
+            with mmap(f.fileno(), 0, access=ACCESS_READ) as m:
+                return sha256(m).hexdigest()
+        return file_digest(f, sha256).hexdigest()
+
+
+async def get_file_hash_async(
+    file_path: str | PathLike[str],
+    executor: Executor | None = None,
+    mmap_threshold: int | None = MMAP_THRESHOLD
+) -> str:
+    """`.get_file_hash`の非同期版です。イベントループをブロックしないように`executor`で計算します。
+    `executor`を省略した場合はイベントループのデフォルトのExecutorが使われます。"""
+    from asyncio import get_running_loop
+
+    return await get_running_loop().run_in_executor(
+        executor, get_file_hash, file_path, mmap_threshold
+    )
+
+
+def hash_files(
+    file_paths: Iterable[str | PathLike[str]],
+    executor: Executor | None = None,
+    max_workers: int | None = None
+) -> dict[str | PathLike[str], str]:
+    """複数のファイルのハッシュを並列に計算して、ファイルのパスとハッシュの辞書を返します。
+    `hashlib`はハッシュの計算中にGILを解放するので、スレッドでもコアの数だけ速くなります。
+    `executor`を省略した場合は、`max_workers`個のスレッドを持つ`ThreadPoolExecutor`を作って使います。"""
+    file_paths = list(file_paths)
+    if executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers, thread_name_prefix="hash_files") as executor:
+            return hash_files(file_paths, executor)
+    return dict(zip(file_paths, executor.map(get_file_hash, file_paths)))
+
+
+async def hash_files_async(
+    file_paths: Iterable[str | PathLike[str]],
+    executor: Executor | None = None
+) -> dict[str | PathLike[str], str]:
+    "`.hash_files`の非同期版です。`executor`を省略した場合はイベントループのデフォルトのExecutorが使われます。"
+    from asyncio import gather
+
+    file_paths = list(file_paths)
+    return dict(zip(file_paths, await gather(*(
+        get_file_hash_async(file_path, executor)
+        for file_path in file_paths
+    ))))
+
+
+class ManifestEntry(NamedTuple):
+    "`.HashManifest`に記録されるファイルの情報です。"
+
+    size: int
+    mtime_ns: int
+    inode: int
+    digest: str
+
+
+@dataclass
+class ManifestChanges:
+    "`.HashManifest.update`で検出された変更です。パスはディレクトリからの相対パスです。"
+
+    added: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+class HashManifest:
+    """ディレクトリの中のファイルのハッシュを記録しておき、変更があったファイルだけを再計算するためのクラスです。
+    ファイルの大きさと更新時刻、inode番号が記録と同じファイルはハッシュを計算しません。
+    そのため、ほとんど変わらないディレクトリの変更の確認がすぐに終わります。
+
+    記録は`.save`でorjsonによるコンパクトなJSONファイルに保存し、`.load`で読み込めます。
+    ディレクトリ全体のハッシュは`.tree_digest`で取得できます。"""
+
+    VERSION = 1
+
+    def __init__(
+        self, root: str | PathLike[str],
+        entries: dict[str, ManifestEntry] | None = None
+    ) -> None:
+        self.root = fspath(root)
+        self.entries = entries or {}
+
+    def _scan(self, path: str, prefix: str) -> Iterator[tuple[str, DirEntry[str]]]:
+        with scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self._scan(entry.path, f"{prefix}{entry.name}/")
+                elif entry.is_file():
+                    yield f"{prefix}{entry.name}", entry
+
+    def update(
+        self, executor: Executor | None = None,
+        max_workers: int | None = None
+    ) -> ManifestChanges:
+        """ディレクトリを走査して記録を更新し、変更を返します。
+        大きさと更新時刻、inode番号のどれかが変わったファイルだけを`.hash_files`で並列に再計算します。"""
+        changes = ManifestChanges()
+        new, stale = dict[str, ManifestEntry](), dict[str, tuple[int, int, int]]()
+        for path, entry in self._scan(self.root, ""):
+            stat = entry.stat()
+            key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            if (old := self.entries.get(path)) is not None and old[:3] == key:
+                new[path] = old
+            else:
+                stale[path] = key
+                (changes.added if old is None else changes.changed).append(path)
+
+        digests = hash_files(
+            (join(self.root, path) for path in stale), executor, max_workers
+        ) if stale else {}
+        for (path, key), digest in zip(stale.items(), digests.values()):
+            new[path] = ManifestEntry(*key, digest)
+
+        changes.removed.extend(path for path in self.entries if path not in new)
+        self.entries = dict(sorted(new.items()))
+        return changes
+
+    def tree_digest(self, directory: str = "") -> str:
+        """ディレクトリ全体のハッシュ（マークル木の根）を返します。
+        `directory`を指定した場合はその中のサブディレクトリのハッシュを返します。"""
+        prefix = f"{directory.strip('/')}/" if directory.strip("/") else ""
+        tree = dict[str, dict | str]()
+        for path, entry in self.entries.items():
+            if not path.startswith(prefix):
+                continue
+            *parents, name = path[len(prefix):].split("/")
+            node = tree
+            for parent in parents:
+                node = node.setdefault(parent, {}) # type: ignore
+            node[name] = entry.digest
+        return self._node_digest(tree).hex()
+
+    @classmethod
+    def _node_digest(cls, node: dict[str, dict | str]) -> bytes:
+        hasher = sha256()
+        for name, child in sorted(node.items()):
+            if isinstance(child, dict):
+                hasher.update(b"D" + name.encode() + b"\0" + cls._node_digest(child))
+            else:
+                hasher.update(b"F" + name.encode() + b"\0" + bytes.fromhex(child))
+        return hasher.digest()
+
+    def save(self, file_path: str | PathLike[str]) -> None:
+        "記録をファイルに保存します。書き込み途中で壊れないように、一時ファイルに書き込んでから置き換えます。"
+        temporary = f"{fspath(file_path)}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(dumps({
+                "version": self.VERSION, "root": self.root,
+                "entries": {path: list(entry) for path, entry in self.entries.items()}
+            }))
+        replace(temporary, file_path)
+
+    @classmethod
+    def load(
+        cls, file_path: str | PathLike[str],
+        root: str | PathLike[str] | None = None
+    ) -> Self:
+        """`.save`で保存した記録を読み込みます。ファイルがない場合や形式が違う場合は空の記録になります。
+        `root`を指定しない場合は、保存されていたディレクトリが使われます。"""
+        try:
+            with open(file_path, "rb") as f:
+                data = loads(f.read())
+        except (FileNotFoundError, ValueError):
+            if root is None:
+                raise
+            return cls(root)
+        if data.get("version") != cls.VERSION:
+            return cls(root or data["root"])
+        return cls(root or data["root"], {
+            path: ManifestEntry(*entry)
+            for path, entry in data["entries"].items()
+        })
@@ -1,8 +1,113 @@
-__all__ = ("loads", "dumps")
+__all__ = (
+    "loads", "dumps", "dumps_bytes", "DEFAULT_OPTIONS", "dump_lines",
+    "load_lines", "dump_lines_async", "load_lines_async"
+)
 
-from orjson import dumps as original_dumps, loads
+from typing import Any, BinaryIO
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+
+from orjson import dumps as original_dumps, loads, \
+    OPT_NON_STR_KEYS, OPT_SERIALIZE_NUMPY, OPT_APPEND_NEWLINE
+
+from .types_ import AsyncReadable, AsyncWritable
+
+
+DEFAULT_OPTIONS = OPT_NON_STR_KEYS | OPT_SERIALIZE_NUMPY
+"`.dumps_bytes`などで使われるorjsonのオプションです。文字列以外のキーやnumpyの配列もそのまま書き出せます。"
+_BUFFER_SIZE = 64 * 1024
 
 
 dumps = lambda content, *args, **kwargs: \
     original_dumps(content, *args, **kwargs).decode()
-"`orjson.dumps`を文字列で返すようにしたものです。"
\ No newline at end of file
+"`orjson.dumps`を文字列で返すようにしたものです。"
+
+
+def dumps_bytes(
+    content: Any, default: Callable[[Any], Any] | None = None,
+    option: int = DEFAULT_OPTIONS
+) -> bytes:
+    """`orjson.dumps`を`.DEFAULT_OPTIONS`で実行したものです。
+    `.dumps`と違い`.decode`をしないので、bytesのまま送信や保存をする際は余計なコピーが発生しません。"""
+    return original_dumps(content, default, option)
+
+
+def _encode_lines(
+    records: Iterable[Any], default: Callable[[Any], Any] | None,
+    option: int
+) -> Iterator[bytes]:
+    "レコードを一行ずつJSONにしたものを、書き込みの回数が減るようにある程度まとめて返します。"
+    buffer, size = list[bytes](), 0
+    option |= OPT_APPEND_NEWLINE
+    for record in records:
+        buffer.append(line := original_dumps(record, default, option))
+        size += len(line)
+        if size >= _BUFFER_SIZE:
+            yield b"".join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _decode_lines(data: bytes) -> Iterator[Any]:
+    for line in data.split(b"\n"):
+        if line.strip():
+            yield loads(line)
+
+
+def dump_lines(
+    records: Iterable[Any], fp: BinaryIO,
+    default: Callable[[Any], Any] | None = None,
+    option: int = DEFAULT_OPTIONS
+) -> int:
+    """レコードをJSON Lines（NDJSON）の形式で`fp`に書き込み、書き込んだレコードの数を返します。
+    レコードは少しずつ処理されるので、ジェネレータを渡せば全てをメモリに載せずに済みます。"""
+    count = 0
+    for chunk in _encode_lines(records, default, option):
+        fp.write(chunk)
+        # JSONの中の改行は必ずエスケープされるので、改行の数がレコードの数になる。
+        count += chunk.count(b"\n")
+    return count
+
+
+def load_lines(fp: BinaryIO) -> Iterator[Any]:
+    "JSON Lines（NDJSON）の形式のファイルを一行ずつ読み込みます。空行は無視されます。"
+    rest = b""
+    while chunk := fp.read(_BUFFER_SIZE):
+        data, _, rest = (rest + chunk).rpartition(b"\n")
+        yield from _decode_lines(data)
+    yield from _decode_lines(rest)
+
+
+async def dump_lines_async(
+    records: Iterable[Any] | AsyncIterable[Any], fp: AsyncWritable,
+    default: Callable[[Any], Any] | None = None,
+    option: int = DEFAULT_OPTIONS
+) -> int:
+    """`.dump_lines`の非同期版です。`aiofiles`で開いたファイルなどに書き込めます。
+    レコードには非同期イテレータも渡せます。"""
+    count = 0
+    if isinstance(records, Iterable):
+        for chunk in _encode_lines(records, default, option):
+            await fp.write(chunk)
+            count += chunk.count(b"\n")
+        return count
+
+    buffer = list[Any]()
+    async for record in records:
+        buffer.append(record)
+        if len(buffer) >= 1024:
+            count += await dump_lines_async(buffer, fp, default, option)
+            buffer.clear()
+    return count + await dump_lines_async(buffer, fp, default, option)
+
+
+async def load_lines_async(fp: AsyncReadable) -> AsyncIterator[Any]:
+    "`.load_lines`の非同期版です。"
+    rest = b""
+    while chunk := await fp.read(_BUFFER_SIZE):
+        data, _, rest = (rest + chunk).rpartition(b"\n")
+        for record in _decode_lines(data):
+            yield record
+    for record in _decode_lines(rest):
+        yield record
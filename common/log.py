@@ -1,13 +1,27 @@
 __all__ = (
     "set_stream_handler", "set_handler", "set_file_handler", "BASE_FORMAT",
-    "NORMAL_FORMATTER", "EXTENDED_FORMATTER"
+    "NORMAL_FORMATTER", "EXTENDED_FORMATTER", "make_file_handler",
+    "make_stream_handler", "set_queue_handler", "FullPolicy",
+    "NonBlockingQueueHandler", "BatchQueueListener", "BatchStreamHandler",
+    "BatchRotatingFileHandler", "JsonFormatter", "JSON_FORMATTER",
+    "RateLimitFilter"
 )
 
-from typing import Any
+from typing import TypeAlias, Literal, Any
+from collections.abc import Callable
+from collections import OrderedDict
 
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import logging
 
+from queue import Queue, Empty, Full
+from copy import copy
+from atexit import register as register_atexit
+from threading import Lock
+from time import monotonic
+
+from .json import dumps_bytes
+
 from pathlib import PurePath
 
 from os import mkdir
@@ -19,13 +33,144 @@ NORMAL_FORMATTER = logging.Formatter(BASE_FORMAT)
 EXTENDED_FORMATTER = logging.Formatter(f"[%(asctime)s] {BASE_FORMAT}", "%Y-%m-%d %H:%M:%S")
 
 
-_last_added_file_handler = None
-def set_file_handler(
-    logger: logging.Logger,
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+class JsonFormatter(logging.Formatter):
+    """ログを一行のJSONにするフォーマッタです。ログの集計基盤で文字列を解析し直さずに済みます。
+    `extra`で渡された値もそのままフィールドとして出力されます。（JSONにできない値は文字列になります。）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": record.created, "level": record.levelname,
+            "name": record.name, "message": record.getMessage(),
+            "module": record.module, "function": record.funcName,
+            "line": record.lineno
+        }
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = self.formatStack(record.stack_info)
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                data[key] = value
+        return dumps_bytes(data, str).decode()
+
+
+JSON_FORMATTER = JsonFormatter()
+
+
+class RateLimitFilter(logging.Filter):
+    """ロガーと呼び出し箇所ごとにログの流量を制限するフィルタです。
+    エラーが大量に発生した際などに、ログの処理のコストやディスクの使用量が際限なく増えないようにします。
+
+    呼び出し箇所ごとに、`burst`件まで溜められて一秒あたり`rate`件ずつ回復するトークンバケットで制限します。
+    制限中でも`sample_every`を設定すると、抑制されたログのうち`sample_every`件に一件は通します。
+    抑制されたログの件数は、`summary_interval`秒ごとに次のログの際に警告のログとして出力されます。
+    そのログの`suppressed`属性には、呼び出し箇所ごとの件数の辞書が入ります。
+    次のログが来ない場合でも出力されるように、タイマーや終了時に`.flush`を呼んでください。
+    （`.BatchQueueListener`は止まる際に、ロガーやハンドラに設定されたこのフィルタの`.flush`を呼びます。）"""
+
+    def __init__(
+        self, rate: float = 10., burst: int = 50,
+        sample_every: int | None = None,
+        summary_interval: float = 60.,
+        max_sites: int = 10000
+    ) -> None:
+        super().__init__()
+        self.rate, self.burst, self.sample_every = rate, burst, sample_every
+        self.summary_interval, self.max_sites = summary_interval, max_sites
+        self.buckets = OrderedDict[tuple[str, str, int], list[float]]()
+        "呼び出し箇所ごとの、トークンの数と最後に更新した時間、制限された回数です。"
+        self.suppressed = dict[tuple[str, str, int], int]()
+        "前回の集計から抑制されたログの件数です。"
+        self._last_summary = monotonic()
+        self._lock = Lock()
+
+    def _take_suppressed(self) -> dict[str, dict[str, int]]:
+        "抑制されたログの件数をロガーの名前ごとにまとめて取り出します。ロックを取った状態で呼んでください。"
+        suppressed = dict[str, dict[str, int]]()
+        for (name, path, line), count in self.suppressed.items():
+            suppressed.setdefault(name, {})[f"{name}:{path}:{line}"] = count
+        self.suppressed.clear()
+        return suppressed
+
+    def _summarize(
+        self, suppressed: dict[str, dict[str, int]],
+        handle: Callable[[logging.LogRecord], Any] | None = None
+    ) -> None:
+        for name, counts in suppressed.items():
+            summary = logging.makeLogRecord({
+                "name": name, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": "流量制限により%d件のログを抑制しました。",
+                "args": (sum(counts.values()),), "suppressed": counts,
+                "_rate_limit_summary": True
+            })
+            (handle or logging.getLogger(name).handle)(summary)
+
+    def flush(self, handle: Callable[[logging.LogRecord], Any] | None = None) -> None:
+        """前回の集計から抑制されたログの件数を、次のログを待たずに出力します。
+        集計のログは、`handle`を渡した場合はそれに、そうでない場合はロガーに渡されます。"""
+        with self._lock:
+            self._last_summary = monotonic()
+            suppressed = self._take_suppressed()
+        self._summarize(suppressed, handle)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "_rate_limit_summary", False):
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = monotonic()
+        with self._lock:
+            if (bucket := self.buckets.get(key)) is None:
+                bucket = self.buckets[key] = [float(self.burst), now, 0]
+                if len(self.buckets) > self.max_sites:
+                    self.buckets.popitem(False)
+            else:
+                self.buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                allowed = True
+            else:
+                bucket[2] += 1
+                allowed = self.sample_every is not None and bucket[2] % self.sample_every == 0
+                if not allowed:
+                    self.suppressed[key] = self.suppressed.get(key, 0) + 1
+
+            suppressed = None
+            if self.suppressed and now - self._last_summary >= self.summary_interval:
+                self._last_summary = now
+                suppressed = self._take_suppressed()
+        if suppressed is not None:
+            self._summarize(suppressed)
+        return allowed
+
+
+class _BatchFlushMixin:
+    "`.BatchQueueListener`がまとめて処理している間は、一件ごとに`flush`しないようにするためのものです。"
+
+    in_batch = False
+
+    def flush(self) -> None:
+        if not self.in_batch:
+            super().flush() # type: ignore
+
+class BatchStreamHandler(_BatchFlushMixin, logging.StreamHandler):
+    "`.BatchQueueListener`でまとめて書き込めるようにした`StreamHandler`です。"
+
+class BatchRotatingFileHandler(_BatchFlushMixin, RotatingFileHandler):
+    "`.BatchQueueListener`でまとめて書き込めるようにした`RotatingFileHandler`です。"
+
+
+def make_file_handler(
     file_path: str | PurePath = "main.log",
     **kwargs: Any
-) -> None:
-    "ファイル出力をロガーに設定します。"
+) -> BatchRotatingFileHandler:
+    "`.set_file_handler`で設定されるハンドラを作ります。"
     if isinstance(file_path, str):
         file_path = PurePath(file_path)
     if not exists(file_path.parent):
@@ -37,8 +182,19 @@ def set_file_handler(
     kwargs.setdefault("maxBytes", 32 * 1024 * 1024)
     kwargs.setdefault("backupCount", 10)
 
-    handler = RotatingFileHandler(**kwargs)
+    handler = BatchRotatingFileHandler(**kwargs)
     handler.setFormatter(EXTENDED_FORMATTER)
+    return handler
+
+
+_last_added_file_handler = None
+def set_file_handler(
+    logger: logging.Logger,
+    file_path: str | PurePath = "main.log",
+    **kwargs: Any
+) -> None:
+    "ファイル出力をロガーに設定します。"
+    handler = make_file_handler(file_path, **kwargs)
 
     # 過去に追加したハンドラがあるのなら、それを削除する。
     global _last_added_file_handler
@@ -50,21 +206,189 @@ def set_file_handler(
     _last_added_file_handler = handler
 
 
+def make_stream_handler() -> BatchStreamHandler:
+    "`.set_stream_handler`で設定されるハンドラを作ります。"
+    handler = BatchStreamHandler()
+    handler.setFormatter(NORMAL_FORMATTER)
+    return handler
+
+
 def set_stream_handler(logger: logging.Logger) -> None:
     "渡されたロガーのログを標準出力に出力するようにします。"
     logger.setLevel(logging.INFO)
-    handler = logging.StreamHandler()
-    handler.setFormatter(NORMAL_FORMATTER)
+    logger.addHandler(make_stream_handler())
+
+
+_DEFAULT_FORMATTER = logging.Formatter()
+FullPolicy: TypeAlias = Literal["block", "drop", "count"]
+"""`.NonBlockingQueueHandler`のキューが一杯の時の動作です。
+`"block"`は空くまで待ち、`"drop"`は捨て、`"count"`は捨てた数を数えて後でその数をログに出します。"""
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    "キューが一杯の時の動作を`.FullPolicy`で選べるようにした`QueueHandler`です。"
+
+    def __init__(self, queue: Queue[Any], policy: FullPolicy = "count") -> None:
+        super().__init__(queue)
+        self.policy = policy
+        self.dropped = 0
+        "捨てたログの数です。"
+        self._unreported = 0
+
+    def _make_dropped_record(self, name: str) -> logging.LogRecord:
+        return logging.makeLogRecord({
+            "name": name, "levelno": logging.WARNING, "levelname": "WARNING",
+            "msg": f"キューが一杯だったため、{self._unreported}件のログを破棄しました。"
+        })
+
+    def report_dropped(self, name: str = "root") -> None:
+        "まだログに出していない破棄した数を、キューが空くまで待ってキューに入れます。終了時などに使います。"
+        if self._unreported:
+            self.queue.put(self._make_dropped_record(name))
+            self._unreported = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 元の実装はここでフォーマッタを通した文字列を`msg`にするので、リスナー側の`.JsonFormatter`などが使えない。
+        # そのため、メッセージと例外の文字列だけを作り、フォーマットはリスナー側のハンドラに任せる。
+        record = copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = (self.formatter or _DEFAULT_FORMATTER).formatException(record.exc_info)
+        record.msg, record.args = record.getMessage(), None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            if self._unreported:
+                self.queue.put_nowait(self._make_dropped_record(record.name))
+                self._unreported = 0
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+            if self.policy == "count":
+                self._unreported += 1
+
+
+class BatchQueueListener(QueueListener):
+    """キューに溜まったログをまとめて処理する`QueueListener`です。
+    まとめて処理している間は`.BatchStreamHandler`などは一件ごとに`flush`せず、最後に一度だけ`flush`します。"""
+
+    def __init__(
+        self, queue: Queue[Any], *handlers: logging.Handler,
+        respect_handler_level: bool = True,
+        batch_size: int = 256
+    ) -> None:
+        super().__init__(queue, *handlers, respect_handler_level=respect_handler_level)
+        self.batch_size = batch_size
+        self.attached: tuple[logging.Logger, QueueHandler] | None = None
+        "キューにログを入れているロガーとハンドラです。`.stop`の際にロガーから外されます。"
+
+    def enqueue_sentinel(self) -> None:
+        # キューには大きさの制限があるので、空くまで待つ。
+        self.queue.put(self._sentinel) # type: ignore
+
+    def _monitor(self) -> None:
+        has_task_done = hasattr(self.queue, "task_done")
+        while True:
+            records = [self.dequeue(True)]
+            try:
+                while len(records) < self.batch_size:
+                    records.append(self.dequeue(False))
+            except Empty:
+                pass
+
+            for handler in self.handlers:
+                if isinstance(handler, _BatchFlushMixin):
+                    handler.in_batch = True
+            stop = False
+            for record in records:
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    self.handle(record)
+            for handler in self.handlers:
+                if isinstance(handler, _BatchFlushMixin):
+                    handler.in_batch = False
+                handler.flush()
+
+            if has_task_done:
+                for _ in records:
+                    self.queue.task_done() # type: ignore
+            if stop:
+                break
+
+    @staticmethod
+    def _rate_limit_filters(*filterers: logging.Filterer) -> list[RateLimitFilter]:
+        return [
+            filter_ for filterer in filterers for filter_ in filterer.filters
+            if isinstance(filter_, RateLimitFilter)
+        ]
+
+    def stop(self) -> None:
+        """キューに残っているログを全て書き込んでからスレッドを止めます。二回以上呼んでも問題ありません。
+        キューにログを入れているハンドラはロガーから外され、`.RateLimitFilter`が設定されている場合はその`flush`が呼ばれます。"""
+        if self._thread is None:
+            return
+        if self.attached is not None:
+            # キューに入る前のフィルタの集計は、キューを介して書き込む。
+            logger, handler = self.attached
+            for filter_ in self._rate_limit_filters(logger, handler):
+                filter_.flush()
+            logger.removeHandler(handler)
+            if isinstance(handler, NonBlockingQueueHandler):
+                handler.report_dropped()
+            self.attached = None
+        super().stop()
+        # キューから出た後のフィルタの集計は、スレッドが止まってから直接書き込む。
+        for filter_ in self._rate_limit_filters(*self.handlers):
+            filter_.flush(self.handle)
+
+
+_last_added_queue_handler: tuple[NonBlockingQueueHandler, BatchQueueListener] | None = None
+def set_queue_handler(
+    logger: logging.Logger, *handlers: logging.Handler,
+    queue_size: int = 10000, policy: FullPolicy = "count",
+    batch_size: int = 256
+) -> BatchQueueListener:
+    """渡されたハンドラでの出力を、キューを介して別スレッドで行うようにします。
+    これにより、イベントループのスレッドでファイルの書き込みなどが行われなくなります。
+    キューの大きさは`queue_size`で、一杯の時の動作は`policy`で設定できます。
+    スレッドは終了時に自動で止まり、残ったログは書き込まれます。"""
+    global _last_added_queue_handler
+    if _last_added_queue_handler is not None:
+        _last_added_queue_handler[1].stop()
+
+    queue = Queue[Any](queue_size)
+    handler = NonBlockingQueueHandler(queue, policy)
+    listener = BatchQueueListener(queue, *handlers, batch_size=batch_size)
+    listener.attached = (logger, handler)
+    listener.start()
+    register_atexit(listener.stop)
+
     logger.addHandler(handler)
+    _last_added_queue_handler = (handler, listener)
+    return listener
 
 
 def set_handler(
     logger: logging.Logger,
     output_file: bool = True,
     stream: bool = True,
+    queue: bool = False,
     **output_kwargs: Any
-) -> None:
-    "渡された`Logger`でログを標準出力に出力するようにします。また、ファイル出力もします。"
+) -> BatchQueueListener | None:
+    """渡された`Logger`でログを標準出力に出力するようにします。また、ファイル出力もします。
+    `queue`が`True`の場合は`.set_queue_handler`を使い、出力を別スレッドで行います。その場合はリスナーを返します。"""
+    if queue:
+        if stream:
+            logger.setLevel(logging.INFO)
+        return set_queue_handler(logger, *(
+            ([make_stream_handler()] if stream else [])
+            + ([make_file_handler(**output_kwargs)] if output_file else [])
+        ))
     if stream:
         set_stream_handler(logger)
     if output_file:
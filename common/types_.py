@@ -1,5 +1,16 @@
-from typing import TypeAlias
+from typing import TypeAlias, Protocol
 from collections.abc import Callable, Coroutine
 
 
-CoroutineFunction: TypeAlias = Callable[..., Coroutine]
\ No newline at end of file
+CoroutineFunction: TypeAlias = Callable[..., Coroutine]
+
+
+class AsyncReadable(Protocol):
+    "`aiofiles`のファイルのような、非同期に読み込めるものの型です。"
+
+    async def read(self, size: int = -1, /) -> bytes: ...
+
+class AsyncWritable(Protocol):
+    "`aiofiles`のファイルのような、非同期に書き込めるものの型です。"
+
+    async def write(self, data: bytes, /) -> int: ...
\ No newline at end of file
@@ -1,27 +1,56 @@
 from __future__ import annotations
 
 __all__ = (
-    "make_error_message", "make_simple_error_text", "code_block", "format_text",
+    "make_error_message", "make_error_fingerprint", "make_simple_error_text",
+    "code_block", "format_text",
     "map_length", "PerformanceStatistics", "take_performance_statistics",
     "make_self_from_row", "camel_to_snake_case", "dict_camel_to_snake_case",
-    "CooldownManager"
+    "deep_camel_to_snake_case", "CooldownManager", "AsyncFuncIO", "Executors",
+    "ExecutorMetrics"
 )
 
-from typing import Self, Generic, TypeVar, ParamSpec, TypedDict, Any, cast
-from collections.abc import Callable, Iterator, Iterable, Sized, Hashable
+from typing import TYPE_CHECKING, Self, Generic, TypeVar, ParamSpec, TypedDict, \
+    NotRequired, Any, cast
+from collections.abc import AsyncIterator, Callable, Iterator, Iterable, Sized, \
+    Hashable
 
 from traceback import TracebackException
+from hashlib import blake2b
 
-from dataclasses import dataclass
-from time import time
-from re import sub
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from itertools import islice
+from string import ascii_uppercase
+from time import time, perf_counter_ns
+from os import cpu_count
 
-from concurrent.futures import ThreadPoolExecutor
-from asyncio import AbstractEventLoop, all_tasks, get_running_loop
+from importlib import import_module
 
-from psutil import cpu_percent, virtual_memory
+from .span import LatencyHistogram
 
-from ..cacher import Cacher, DictCache
+# 起動を速くするため、重い依存関係（psutil、asyncio、concurrent.futures、キャッシュ）は使う時に読み込む。
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+    from asyncio import AbstractEventLoop, Future
+
+    from ..cacher import Cacher
+    from .performance_sampler import PerformanceSampler
+    from .loop_watchdog import LoopWatchdog
+    from .error_reporter import ErrorReporter
+
+
+_LAZY_ATTRIBUTES = {
+    "PerformanceSampler": ".performance_sampler",
+    "LoopWatchdog": ".loop_watchdog",
+    "ErrorReporter": ".error_reporter"
+}
+def __getattr__(name: str) -> Any:
+    "サブモジュールのクラスなどを、初めて使われた時に読み込みます。"
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 CKeyT = TypeVar("CKeyT", bound=Hashable)
@@ -33,6 +62,8 @@ class CooldownManager(Generic[CKeyT]):
         rate: int = 2, per: float = 2.,
         max_cooldown_count: int = 3
     ) -> None:
+        from ..cacher import DictCache
+
         self.cacher, self.rate, self.per = cacher, rate, per
         self.max_cooldown_count = max_cooldown_count
         self.cache = cacher.register(
@@ -71,21 +102,140 @@ def make_self_from_row(dataclass: type[MsfrT], row: Iterable[Any]) -> MsfrT:
     return dataclass(**{key: arg for key, arg in zip(dataclass.__annotations__.keys(), row)})
 
 
+@dataclass
+class ExecutorMetrics:
+    "`.AsyncFuncIO`で実行した処理の指標です。"
+
+    workers: int
+    "Executorのワーカーの数"
+    submitted: int = 0
+    "Executorに渡した処理の数"
+    completed: int = 0
+    "終わった処理の数（失敗したものも含む）"
+    failed: int = 0
+    "エラーが発生した処理の数"
+    waiting: int = 0
+    "`max_in_flight`の制限により、Executorに渡されるのを待っている処理の数"
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    "Executorに渡してから終わるまでの時間（ナノ秒）"
+
+    @property
+    def in_flight(self) -> int:
+        "Executorに渡したがまだ終わっていない処理の数です。"
+        return self.submitted - self.completed
+
+    @property
+    def queue_depth(self) -> int:
+        "Executorのキューに溜まっている処理のおおよその数です。"
+        return max(0, self.in_flight - self.workers)
+
+    def export(self) -> dict[str, Any]:
+        "指標を辞書で返します。"
+        return {
+            "workers": self.workers, "submitted": self.submitted,
+            "completed": self.completed, "failed": self.failed,
+            "waiting": self.waiting, "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth, "latency": self.latency.export()
+        }
+
+
+def _call_chunk(func: Callable[[Any], Any], chunk: list[Any]) -> list[Any]:
+    "`.AsyncFuncIO.map`で使う関数です。プロセスプールでも動かせるようにモジュールの関数にしています。"
+    return [func(item) for item in chunk]
+
+
 ArReT, ArP = TypeVar("ArReT"), ParamSpec("ArP")
 class AsyncFuncIO:
-    "同期関数をスレッドプールで非同期に対応させるのに使える関数です。"
+    """同期関数をスレッドプールで非同期に対応させるのに使える関数です。
+    `max_in_flight`を指定すると、同時にExecutorに渡す処理の数がそれまでに制限され、それ以上は空くまで待つようになります。
+    実行した処理の指標は`.metrics`で取得できます。"""
+
+    def __init__(
+        self, executor: Executor,
+        loop: AbstractEventLoop | None = None,
+        max_in_flight: int | None = None
+    ) -> None:
+        from asyncio import Semaphore, get_running_loop
 
-    def __init__(self, executor: ThreadPoolExecutor, loop: AbstractEventLoop | None = None) -> None:
         self.executor, self.loop = executor, loop or get_running_loop()
+        self.max_in_flight = max_in_flight
+        self._semaphore = None if max_in_flight is None else Semaphore(max_in_flight)
+        self.metrics = ExecutorMetrics(getattr(executor, "_max_workers", 1))
+
+    async def _submit(self, func: Callable[..., ArReT], *args: Any) -> ArReT:
+        if self._semaphore is not None:
+            self.metrics.waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.metrics.waiting -= 1
+        self.metrics.submitted += 1
+        start = perf_counter_ns()
+        try:
+            return await self.loop.run_in_executor(self.executor, func, *args)
+        except Exception:
+            self.metrics.failed += 1
+            raise
+        finally:
+            self.metrics.completed += 1
+            self.metrics.latency.record(perf_counter_ns() - start)
+            if self._semaphore is not None:
+                self._semaphore.release()
 
     async def run(
         self, func: Callable[ArP, ArReT],
         *args: ArP.args, **kwargs: ArP.kwargs
     ) -> ArReT:
         "同期関数を非同期に実行します。"
-        return await self.loop.run_in_executor(
-            self.executor, lambda: func(*args, **kwargs)
-        )
+        if kwargs:
+            return await self._submit(partial(func, *args, **kwargs))
+        return await self._submit(func, *args)
+
+    async def map(
+        self, func: Callable[[Any], ArReT], iterable: Iterable[Any],
+        ordered: bool = True, chunk_size: int | None = None
+    ) -> AsyncIterator[ArReT]:
+        """`iterable`の各要素に`func`を適用した結果を返す非同期イテレータです。
+        要素は`chunk_size`個ずつまとめてExecutorに渡されます。（プロセスプールの場合はプロセス間通信の回数が減ります。）
+        `chunk_size`を省略した場合は、要素の数とワーカーの数から決められます。（数が分からない場合は`1`です。）
+        同時にExecutorに渡すまとまりの数は`max_in_flight`（未指定の場合はワーカーの数の二倍）までです。
+        `ordered`が`False`の場合は、終わった順に結果を返します。"""
+        from asyncio import FIRST_COMPLETED, Future, wait
+
+        workers = self.metrics.workers
+        if chunk_size is None:
+            chunk_size = max(1, len(iterable) // (workers * 4)) \
+                if isinstance(iterable, Sized) else 1
+        iterator = iter(iterable)
+        chunks = iter(lambda: list(islice(iterator, chunk_size)), [])
+        window = self.max_in_flight or workers * 2
+
+        pending, exhausted = list[Future[list[ArReT]]](), False
+        try:
+            while True:
+                while not exhausted and len(pending) < window:
+                    if (chunk := next(chunks, None)) is None:
+                        exhausted = True
+                    else:
+                        pending.append(self.loop.create_task(
+                            self._submit(_call_chunk, func, chunk)
+                        ))
+                if not pending:
+                    break
+
+                if ordered:
+                    done = [pending.pop(0)]
+                    await done[0]
+                else:
+                    done, _ = await wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                for future in done:
+                    for result in future.result():
+                        yield result
+        finally:
+            for future in pending:
+                future.cancel()
 
     @classmethod
     def from_executors(
@@ -94,7 +244,7 @@ class AsyncFuncIO:
         *args: Any, **kwargs: Any
     ) -> Self:
         "`.Executors`から作ります。"
-        return cls(getattr(executors, attr_name) *args, **kwargs)
+        return cls(getattr(executors, attr_name), *args, **kwargs)
 
 
 @dataclass
@@ -105,6 +255,10 @@ class Executors(AsyncFuncIO):
     "通常の処理を回す際はこちらを使用してください。Botのclose時にはfutureはキャンセルされます。"
     cleaning: ThreadPoolExecutor
     "お片付け系の実行しないということがない方が良いような処理はこちらでやってください。"
+    process: ProcessPoolExecutor | None = None
+    """ハッシュの計算や画像の処理などのCPUを使う処理はこちらを使用してください。GILに縛られません。
+    渡す関数と引数はpickleできる必要があります。Botのclose時には実行中でないfutureはキャンセルされます。"""
+    _ios: dict[str, AsyncFuncIO] = field(default_factory=dict, repr=False)
 
     def __post_init__(self) -> None:
         self.init_super = super().__init__
@@ -113,21 +267,45 @@ class Executors(AsyncFuncIO):
     def default(
         cls, prefix: str = "",
         normal_name: str = "normal_executor",
-        cleaning_name: str = "cleaning_executor"
+        cleaning_name: str = "cleaning_executor",
+        process_workers: int | None = None
     ) -> Self:
-        "このクラスのインスタンスを作ります。"
+        """このクラスのインスタンスを作ります。
+        プロセスプールのプロセスの数は、`process_workers`を省略した場合はCPUのコアの数になります。（`0`の場合は作りません。）"""
+        from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
         return cls(*(
             ThreadPoolExecutor(i, thread_name_prefix=prefix)
             for i, prefix in (
                 (4, f"{prefix}{normal_name}"),
                 (2, f"{prefix}{cleaning_name}")
             )
-        ))
+        ), ProcessPoolExecutor(process_workers or cpu_count())
+            if process_workers != 0 else None)
+
+    def get_io(
+        self, attr_name: str = "normal",
+        max_in_flight: int | None = None
+    ) -> AsyncFuncIO:
+        """指定されたExecutorを使う`.AsyncFuncIO`を返します。
+        同じExecutorには同じものを返すので、そのExecutorの指標は`.metrics`でまとめて取得できます。
+        `max_in_flight`は初めて作る際にのみ使われます。"""
+        if attr_name not in self._ios:
+            self._ios[attr_name] = AsyncFuncIO.from_executors(
+                self, attr_name, max_in_flight=max_in_flight
+            )
+        return self._ios[attr_name]
+
+    def export_metrics(self) -> dict[str, dict[str, Any]]:
+        "`.get_io`で作った`.AsyncFuncIO`の指標をExecutorごとにまとめて返します。"
+        return {name: io.metrics.export() for name, io in self._ios.items()}
 
     def close(self) -> None:
         "Executorを閉じます。"
         self.normal.shutdown(False, cancel_futures=True)
         self.cleaning.shutdown(True)
+        if self.process is not None:
+            self.process.shutdown(True, cancel_futures=True)
 
 
 def make_error_message(error: BaseException) -> str:
@@ -135,6 +313,27 @@ def make_error_message(error: BaseException) -> str:
     return "".join(TracebackException.from_exception(error).format())
 
 
+def make_error_fingerprint(error: BaseException, max_depth: int = 8) -> str:
+    """渡されたエラーの指紋を作ります。
+    エラーの型とトレースバックの各フレームの場所（ファイル、関数、行）から作られ、エラーのメッセージは含みません。
+    そのため、同じ箇所で発生した同じ種類のエラーは同じ指紋になります。原因となったエラーも`max_depth`個まで含みます。"""
+    hasher, seen = blake2b(digest_size=8), set[int]()
+    current: BaseException | None = error
+    while current is not None and id(current) not in seen and len(seen) < max_depth:
+        seen.add(id(current))
+        hasher.update(f"{current.__class__.__module__}.{current.__class__.__qualname__}".encode())
+        tb = current.__traceback__
+        while tb is not None:
+            code = tb.tb_frame.f_code
+            hasher.update(f"|{code.co_filename}:{code.co_name}:{tb.tb_lineno}".encode())
+            tb = tb.tb_next
+        hasher.update(b"\n")
+        current = current.__cause__ or (
+            None if current.__suppress_context__ else current.__context__
+        )
+    return hasher.hexdigest()
+
+
 def make_simple_error_text(error: BaseException) -> str:
     "渡されたエラーから名前とエラー内容の文字列にします。"
     return f"{error.__class__.__name__}: {error}"
@@ -169,12 +368,47 @@ class PerformanceStatistics(TypedDict):
     "非同期イベントループのタスクの数です。"
     database_pool_size: int
     "データベースの接続の数。"
+    blocking: NotRequired[dict[str, Any]]
+    "イベントループがブロックされた回数や箇所です。`.LoopWatchdog.export`の返り値です。"
 
 def take_performance_statistics(
     loop: AbstractEventLoop | None,
-    database_pool_size: int
+    database_pool_size: int,
+    sampler: PerformanceSampler | None = None,
+    watchdog: LoopWatchdog | None = None
+) -> PerformanceStatistics:
+    """現在の動作状況をまとめた辞書を返します。
+    `sampler`を渡さない場合はCPU使用率の計測のために一秒間ブロックします。
+    渡した場合は`.PerformanceSampler`の最新の値（まだない場合はその場で取得した値）を使うので、ブロックしません。
+    `watchdog`を渡した場合は、イベントループがブロックされた箇所の集計も含めます。"""
+    statistics = _take_performance_statistics(loop, database_pool_size, sampler)
+    if watchdog is not None:
+        statistics["blocking"] = watchdog.export()
+    return statistics
+
+def _take_performance_statistics(
+    loop: AbstractEventLoop | None,
+    database_pool_size: int,
+    sampler: PerformanceSampler | None
 ) -> PerformanceStatistics:
-    "現在の動作状況をまとめた辞書を返します。"
+    from asyncio import all_tasks
+    from psutil import cpu_percent, virtual_memory
+
+    if sampler is not None:
+        # まだ一度も取得していない場合（スレッドを始める前など）でも、ブロックせずにその場で取得する。
+        if (sample := sampler.latest) is None:
+            sample = sampler.take()
+        return PerformanceStatistics(
+            cpu=sample.cpu,
+            memory=(
+                sample.memory_used,
+                sample.memory_free,
+                sample.memory_total
+            ),
+            task_amount=sample.task_amount if loop is None
+                else len(all_tasks(loop)),
+            database_pool_size=database_pool_size
+        )
     memory = virtual_memory()
     return PerformanceStatistics(
         cpu=cpu_percent(interval=1),
@@ -188,9 +422,12 @@ def take_performance_statistics(
     )
 
 
+_CAMEL_TO_SNAKE_TABLE = str.maketrans({c: f"_{c.lower()}" for c in ascii_uppercase})
+@lru_cache(4096)
 def camel_to_snake_case(key: str, support_upper_camel_case: bool = True) -> str:
-    "キャメルケースをスネークケースにします。"
-    value = sub("([A-Z])", lambda s: "_%s" % s.group(1).lower(), key)
+    """キャメルケースをスネークケースにします。
+    同じキーを何度も変換することが多いので、結果は一定の数までキャッシュされます。"""
+    value = key.translate(_CAMEL_TO_SNAKE_TABLE)
     if support_upper_camel_case and value and value[0] == "_":
         value = value[1:]
     return value
@@ -208,4 +445,39 @@ def dict_camel_to_snake_case(
                 if key in (replace_values or ())
                 else value
         for key, value in data.items()
-    }
\ No newline at end of file
+    }
+
+
+def deep_camel_to_snake_case(
+    data: Any, *args: Any,
+    replace_values: dict[str, Callable[[Any], Any]] | None = None,
+    **kwargs: Any
+) -> Any:
+    """`.dict_camel_to_snake_case`を、辞書やリストの中の辞書にも再帰的に行います。
+    辞書のリストを渡せば、まとめて変換できます。
+    `replace_values`は元のキーに対して適用され、適用された値の中は変換しません。
+    中身が何も変わらなかった辞書やリストは作り直さず、元のオブジェクトをそのまま返します。"""
+    if isinstance(data, dict):
+        new, changed = {}, False
+        for key, value in data.items():
+            new_key = camel_to_snake_case(key, *args, **kwargs) \
+                if isinstance(key, str) else key
+            if replace_values is not None and key in replace_values:
+                new_value = replace_values[key](value)
+            else:
+                new_value = deep_camel_to_snake_case(
+                    value, *args, replace_values=replace_values, **kwargs
+                )
+            changed = changed or new_key != key or new_value is not value
+            new[new_key] = new_value
+        return new if changed else data
+    if isinstance(data, list):
+        new_list = [
+            deep_camel_to_snake_case(
+                value, *args, replace_values=replace_values, **kwargs
+            ) for value in data
+        ]
+        return new_list if any(
+            new_value is not value for new_value, value in zip(new_list, data)
+        ) else data
+    return data
\ No newline at end of file
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+__all__ = ("ErrorRecord", "ErrorReporter")
+
+from typing import Any
+from collections import OrderedDict
+
+from dataclasses import dataclass
+from threading import Lock
+from time import monotonic
+
+from logging import Logger, getLogger, ERROR
+
+from . import make_error_message, make_error_fingerprint, make_simple_error_text
+
+
+@dataclass
+class ErrorRecord:
+    "`.ErrorReporter`が指紋ごとに持っている記録です。"
+
+    fingerprint: str
+    text: str
+    "初めて発生した際のエラーの全文"
+    summary: str = ""
+    "初めて発生した際のエラーの短い説明"
+    count: int = 0
+    "発生した回数"
+    unreported: int = 0
+    "前回ログに出してから発生した回数"
+    last_reported: float = 0.
+
+
+class ErrorReporter:
+    """同じエラーを何度もログに出さないようにするためのクラスです。
+    エラーを`.make_error_fingerprint`で指紋にし、初めて発生した際は全文を、それ以降は`interval`秒ごとに発生した回数だけをログに出します。
+    全文は指紋ごとに`max_size`個までキャッシュされるので、大量にエラーが発生した際でもトレースバックの整形は一回で済みます。
+    回数は同じエラーが`interval`秒後に再び発生した際に出されるので、最後の回数も出すには、タイマーや終了時に`.flush`を呼んでください。"""
+
+    def __init__(
+        self, logger: Logger | None = None,
+        interval: float = 60., max_size: int = 1000,
+        level: int = ERROR
+    ) -> None:
+        self.logger = logger or getLogger(__name__)
+        self.interval, self.max_size, self.level = interval, max_size, level
+        self.records = OrderedDict[str, ErrorRecord]()
+        self._lock = Lock()
+
+    def get_text(self, error: BaseException) -> str:
+        "エラーの全文を返します。同じ指紋のエラーはキャッシュされた全文を返します。"
+        return self._get_record(error, make_error_fingerprint(error))[0].text
+
+    def _get_record(self, error: BaseException, fingerprint: str) -> tuple[ErrorRecord, bool]:
+        with self._lock:
+            if (record := self.records.get(fingerprint)) is not None:
+                self.records.move_to_end(fingerprint)
+                return record, False
+        record = ErrorRecord(
+            fingerprint, make_error_message(error),
+            make_simple_error_text(error)
+        )
+        with self._lock:
+            if (existing := self.records.get(fingerprint)) is not None:
+                return existing, False
+            self.records[fingerprint] = record
+            if len(self.records) > self.max_size:
+                self.records.popitem(False)
+        return record, True
+
+    def report(self, error: BaseException, **kwargs: Any) -> str:
+        """エラーを記録し、必要ならログに出します。指紋を返します。
+        `kwargs`は`Logger.log`に渡されます。"""
+        fingerprint = make_error_fingerprint(error)
+        record, new = self._get_record(error, fingerprint)
+        now = monotonic()
+        with self._lock:
+            record.count += 1
+            if new:
+                record.last_reported = now
+                log = None
+            elif now - record.last_reported >= self.interval:
+                record.last_reported, log = now, record.unreported + 1
+                record.unreported = 0
+            else:
+                record.unreported += 1
+                return fingerprint
+
+        if log is None:
+            self.logger.log(
+                self.level, "エラーが発生しました。（指紋: %s）\n%s",
+                fingerprint, record.text, **kwargs
+            )
+        else:
+            self.logger.log(
+                self.level, "同じエラーが%d回発生しました。（指紋: %s、合計: %d回）: %s",
+                log, fingerprint, record.count, make_simple_error_text(error), **kwargs
+            )
+        return fingerprint
+
+    def flush(self, **kwargs: Any) -> int:
+        """まだログに出していない回数があるエラーについて、その回数をログに出します。ログに出したエラーの数を返します。
+        `kwargs`は`Logger.log`に渡されます。"""
+        now, flushed = monotonic(), list[tuple[ErrorRecord, int, int]]()
+        with self._lock:
+            for record in self.records.values():
+                if record.unreported:
+                    flushed.append((record, record.unreported, record.count))
+                    record.last_reported, record.unreported = now, 0
+        for record, unreported, count in flushed:
+            self.logger.log(
+                self.level, "同じエラーが%d回発生しました。（指紋: %s、合計: %d回）: %s",
+                unreported, record.fingerprint, count, record.summary, **kwargs
+            )
+        return len(flushed)
+
+    def export(self) -> dict[str, int]:
+        "指紋ごとの発生回数を返します。"
+        return {fingerprint: record.count for fingerprint, record in self.records.items()}
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+__all__ = ("BlockingSite", "LoopWatchdog")
+
+from typing import Any
+
+from threading import Thread, Event, get_ident
+from asyncio import AbstractEventLoop
+from dataclasses import dataclass
+from traceback import extract_stack
+from time import perf_counter
+from sys import _current_frames
+
+from logging import Logger, getLogger
+
+
+@dataclass
+class BlockingSite:
+    "イベントループをブロックしていた箇所の集計です。"
+
+    stack: tuple[str, ...]
+    "ブロックしていた時のスタックの末尾の数フレーム（`ファイル:行 in 関数`の形式）"
+    count: int = 0
+    "この箇所でブロックしていた回数"
+    samples: int = 0
+    "この箇所でスタックを取得した回数"
+    blocked: float = 0.
+    "この箇所でブロックしていた時間の合計（秒）"
+
+    def export(self) -> dict[str, Any]:
+        return {
+            "stack": list(self.stack), "count": self.count,
+            "samples": self.samples, "blocked": self.blocked
+        }
+
+
+class LoopWatchdog(Thread):
+    """イベントループがブロックされていないかを別スレッドで監視するためのクラスです。
+    `interval`秒ごとにイベントループにコールバックを予約し、`threshold`秒以上実行されない場合はブロックされているとみなします。
+    ブロックされている間は`sys._current_frames`でイベントループのスレッドのスタックを取得し、
+    ブロックしていた箇所ごとに回数と時間を集計します。ブロックが終わると`logger`に警告を出します。
+    集計は`.top`や`.export`で取得でき、`take_performance_statistics`にも渡せます。"""
+
+    def __init__(
+        self, loop: AbstractEventLoop,
+        interval: float = 0.05, threshold: float = 0.1,
+        logger: Logger | None = None, depth: int = 5,
+        max_sites: int = 1000, *args: Any, **kwargs: Any
+    ) -> None:
+        self.loop, self.interval, self.threshold = loop, interval, threshold
+        self.logger = logger or getLogger(__name__)
+        self.depth, self.max_sites = depth, max_sites
+        self.sites = dict[tuple[str, ...], BlockingSite]()
+        self.blocked_count, self.blocked_total = 0, 0.
+        "ブロックされた回数と時間の合計（秒）です。"
+        self.loop_thread_id: int | None = None
+        self._close = Event()
+        self._pending_since: float | None = None
+        self._blocking = False
+        self._episode_sites = set[tuple[str, ...]]()
+        self._episode_lag: float | None = None
+        self._last_sample = 0.
+        kwargs.setdefault("daemon", True)
+        kwargs.setdefault("name", "loop_watchdog")
+        super().__init__(*args, **kwargs)
+
+    def _beat(self) -> None:
+        "イベントループで実行されるコールバックです。"
+        self.loop_thread_id = get_ident()
+        if self._pending_since is not None and self._blocking:
+            self._episode_lag = perf_counter() - self._pending_since
+        self._pending_since = None
+
+    def _sample(self, now: float) -> None:
+        "イベントループのスレッドのスタックを取得して集計します。"
+        if self.loop_thread_id is None \
+                or (frame := _current_frames().get(self.loop_thread_id)) is None:
+            return
+        key = tuple(
+            f"{summary.filename}:{summary.lineno} in {summary.name}"
+            for summary in extract_stack(frame)[-self.depth:]
+        )
+        del frame
+        if (site := self.sites.get(key)) is None:
+            if len(self.sites) >= self.max_sites:
+                return
+            site = self.sites[key] = BlockingSite(key)
+        if key not in self._episode_sites:
+            self._episode_sites.add(key)
+            site.count += 1
+        site.samples += 1
+        site.blocked += now - self._last_sample
+        self._last_sample = now
+
+    def _report(self, lag: float) -> None:
+        "ブロックが終わった際に集計と警告をします。"
+        self.blocked_count += 1
+        self.blocked_total += lag
+        stacks = [self.sites[key].stack for key in self._episode_sites if key in self.sites]
+        self._episode_sites.clear()
+        self._blocking = False
+        self.logger.warning(
+            "イベントループが%.3f秒ブロックされました。ブロックしていた箇所:\n%s",
+            lag, "\n".join("\n".join(f"  {frame}" for frame in stack) for stack in stacks)
+        )
+
+    def check(self) -> None:
+        "一回分の監視を行います。`run`から呼ばれます。"
+        if (lag := self._episode_lag) is not None:
+            self._episode_lag = None
+            self._report(lag)
+
+        now = perf_counter()
+        if self._pending_since is None:
+            self._pending_since = now
+            try:
+                self.loop.call_soon_threadsafe(self._beat)
+            except RuntimeError:
+                self._pending_since = None
+        elif now - self._pending_since >= self.threshold:
+            if not self._blocking:
+                self._blocking = True
+                self._last_sample = self._pending_since
+            self._sample(now)
+
+    def top(self, amount: int = 10) -> list[BlockingSite]:
+        "ブロックしていた時間が長い順に箇所を返します。"
+        return sorted(self.sites.values(), key=lambda site: site.blocked, reverse=True)[:amount]
+
+    def export(self, amount: int = 10) -> dict[str, Any]:
+        "集計を辞書で返します。"
+        return {
+            "count": self.blocked_count, "total": self.blocked_total,
+            "sites": [site.export() for site in self.top(amount)]
+        }
+
+    def close(self) -> None:
+        "監視を止めます。"
+        self._close.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self) -> None:
+        while not self._close.is_set() and not self.loop.is_closed():
+            self.check()
+            self._close.wait(self.interval)
+
+    def __str__(self) -> str:
+        return f"<LoopWatchdog threshold={self.threshold} count={self.blocked_count} thread={super()}>"
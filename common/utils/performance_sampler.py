@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+__all__ = ("PerformanceSample", "PerformanceSampler")
+
+from typing import NamedTuple, Any
+from collections import deque
+
+from threading import Thread, Event, Lock
+from asyncio import AbstractEventLoop, all_tasks
+from time import time, perf_counter
+
+from psutil import Process, NoSuchProcess, cpu_percent, virtual_memory
+
+
+class PerformanceSample(NamedTuple):
+    "`.PerformanceSampler`が一回で取得する動作状況です。"
+
+    time: float
+    cpu: float
+    "CPU使用率"
+    memory_used: float
+    memory_free: float
+    memory_total: float
+    rss: int
+    "このプロセスと子プロセスの使用メモリ（RSS）の合計"
+    task_amount: int
+    "非同期イベントループのタスクの数"
+    loop_lag: float
+    "イベントループの遅延（秒）。コールバックを予約してから実行されるまでの時間です。"
+
+
+class PerformanceSampler(Thread):
+    """動作状況を別スレッドで一定間隔ごとに取得し、決まった数だけ保存しておくためのクラスです。
+    `.Cacher`と同じく`.Thread`を継承していて、`start`で動き始めます。
+    `psutil.cpu_percent(interval=1)`のように呼び出し元を一秒止めることがなく、
+    最新の値と移動平均は`.latest`と`.average`で待たずに取得できます。"""
+
+    def __init__(
+        self, loop: AbstractEventLoop | None = None,
+        interval: float = 1., size: int = 60,
+        *args: Any, **kwargs: Any
+    ) -> None:
+        self.loop, self.interval = loop, interval
+        self.samples = deque[PerformanceSample](maxlen=size)
+        self._sums = [0.] * len(PerformanceSample._fields)
+        self._lock = Lock()
+        self._close = Event()
+        self._lag = self._lag_scheduled = 0.
+        self._lag_pending = False
+        self.process = Process()
+        kwargs.setdefault("daemon", True)
+        kwargs.setdefault("name", "performance_sampler")
+        super().__init__(*args, **kwargs)
+
+    def _schedule_lag_probe(self) -> None:
+        "イベントループにコールバックを予約して、実行されるまでの時間を測ります。"
+        if self.loop is None or self._lag_pending or self.loop.is_closed():
+            return
+        self._lag_scheduled = scheduled = perf_counter()
+        def probe() -> None:
+            self._lag = perf_counter() - scheduled
+            self._lag_pending = False
+        self._lag_pending = True
+        try:
+            self.loop.call_soon_threadsafe(probe)
+        except RuntimeError:
+            self._lag_pending = False
+
+    def _rss(self) -> int:
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except NoSuchProcess:
+                pass
+        return rss
+
+    def take(self) -> PerformanceSample:
+        "動作状況を取得して保存します。`run`から呼ばれます。"
+        memory = virtual_memory()
+        # まだ実行されていない場合は、予約してからの経過時間を遅延とする。
+        lag = max(self._lag, perf_counter() - self._lag_scheduled) \
+            if self._lag_pending else self._lag
+        sample = PerformanceSample(
+            time(), cpu_percent(interval=None),
+            memory.used, memory.free, memory.total, self._rss(),
+            0 if self.loop is None else len(all_tasks(self.loop)),
+            lag
+        )
+        self._schedule_lag_probe()
+
+        with self._lock:
+            if len(self.samples) == self.samples.maxlen:
+                for i, value in enumerate(self.samples[0]):
+                    self._sums[i] -= value
+            self.samples.append(sample)
+            for i, value in enumerate(sample):
+                self._sums[i] += value
+        return sample
+
+    @property
+    def latest(self) -> PerformanceSample | None:
+        "最新の動作状況です。まだ取得していない場合は`None`です。"
+        try:
+            return self.samples[-1]
+        except IndexError:
+            return None
+
+    def average(self) -> PerformanceSample | None:
+        "保存されている動作状況の平均です。まだ取得していない場合は`None`です。"
+        with self._lock:
+            if not self.samples:
+                return None
+            return PerformanceSample(*(value / len(self.samples) for value in self._sums))
+
+    def close(self) -> None:
+        "スレッドを止めます。"
+        self._close.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self) -> None:
+        cpu_percent(interval=None)
+        while not self._close.is_set():
+            self.take()
+            self._close.wait(self.interval)
+
+    def __str__(self) -> str:
+        return f"<PerformanceSampler interval={self.interval} latest={self.latest} thread={super()}>"
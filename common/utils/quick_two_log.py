@@ -1,17 +1,25 @@
 __all__ = ("QuickTwoLog", "InfoCache")
 
+from typing import Any
+
 from dataclasses import dataclass
+from time import perf_counter_ns
 
 from logging import Logger
 
+from .span import SpanRecorder, spans
+
 
 @dataclass
 class QuickTwoLog:
-    "簡単に処理前後のログを出すためのもの。"
+    """簡単に処理前後のログを出すためのもの。`with`と`async with`の両方で使えます。
+    `name`を指定すると処理時間を計測して`recorder`に記録し、処理後のログに処理時間を付けます。"""
 
     logger: Logger
     before: str | None = None
     after: str | None = None
+    name: str | None = None
+    recorder: SpanRecorder = spans
 
     def __post_init__(self) -> None:
         if self.before is None:
@@ -21,9 +29,21 @@ class QuickTwoLog:
 
     def __enter__(self) -> None:
         self.logger.info(self.before)
+        self._start = perf_counter_ns()
 
     def __exit__(self, *_) -> None:
-        self.logger.info(self.after)
+        if self.name is None or not self.recorder.enabled:
+            self.logger.info(self.after)
+        else:
+            elapsed = perf_counter_ns() - self._start
+            self.recorder.record(self.name, elapsed)
+            self.logger.info("%s (%.3f秒)", self.after, elapsed / 1e9)
+
+    async def __aenter__(self) -> None:
+        self.__enter__()
+
+    async def __aexit__(self, *args: Any) -> None:
+        self.__exit__(*args)
 
 
 class InfoCache(QuickTwoLog):
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+__all__ = ("LatencyHistogram", "Span", "SpanRecorder", "spans", "span")
+
+from typing import TYPE_CHECKING, TypeVar, Any, cast
+from collections.abc import Callable
+
+from functools import wraps
+from threading import Lock
+from time import perf_counter_ns
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+
+class LatencyHistogram:
+    """処理時間（ナノ秒）を対数のバケットで集計するヒストグラムです。
+    二の累乗ごとの区間を更に`2 ** sub_bits`個に分けるので、パーセンタイルの相対誤差は最大で`2 ** -sub_bits`程度です。
+    記録は整数の演算だけで済み、メモリ使用量は記録した数に関わらずほぼ一定です。"""
+
+    __slots__ = ("sub_bits", "buckets", "count", "total", "min", "max", "_lock")
+
+    def __init__(self, sub_bits: int = 3) -> None:
+        self.sub_bits = sub_bits
+        self.buckets = dict[int, int]()
+        self.count = self.total = self.max = 0
+        self.min: int | None = None
+        self._lock = Lock()
+
+    def _index(self, value: int) -> int:
+        if (exponent := value.bit_length()) <= self.sub_bits:
+            return value
+        shift = exponent - self.sub_bits - 1
+        return ((shift + 1) << self.sub_bits) + (value >> shift) - (1 << self.sub_bits)
+
+    def _lower(self, index: int) -> int:
+        "バケットの下限の値を返します。"
+        if index < 1 << (self.sub_bits + 1):
+            return index
+        shift = (index >> self.sub_bits) - 1
+        return ((index & ((1 << self.sub_bits) - 1)) + (1 << self.sub_bits)) << shift
+
+    def record(self, value: int) -> None:
+        "値を記録します。"
+        index = self._index(value)
+        with self._lock:
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, percent: float) -> int:
+        "指定されたパーセンタイルの値（を含むバケットの中央の値）を返します。何も記録されていない場合は`0`です。"
+        if not self.count:
+            return 0
+        target, seen = max(1, round(self.count * percent / 100)), 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                middle = (self._lower(index) + self._lower(index + 1)) // 2
+                return min(max(middle, cast(int, self.min)), self.max)
+        return self.max
+
+    def reset(self) -> None:
+        "記録を全て消します。"
+        with self._lock:
+            self.buckets.clear()
+            self.count = self.total = self.max = 0
+            self.min = None
+
+    def export(self) -> dict[str, float]:
+        "集計結果を辞書で返します。時間の単位はナノ秒です。"
+        return {
+            "count": self.count, "total": self.total,
+            "mean": self.total / self.count if self.count else 0.,
+            "min": self.min or 0, "max": self.max,
+            "p50": self.percentile(50), "p90": self.percentile(90),
+            "p99": self.percentile(99), "p999": self.percentile(99.9)
+        }
+
+
+SfT = TypeVar("SfT", bound=Callable[..., Any])
+class Span:
+    """処理時間を計測して`.SpanRecorder`に記録するためのものです。
+    `with`と`async with`の両方で使え、デコレータとしても使えます。（デコレータの場合は呼び出しごとに計測されます。）"""
+
+    __slots__ = ("recorder", "name", "threshold_ns", "logger", "start", "elapsed_ns")
+
+    def __init__(
+        self, recorder: SpanRecorder, name: str,
+        threshold_ns: int | None = None,
+        logger: Logger | None = None
+    ) -> None:
+        self.recorder, self.name = recorder, name
+        self.threshold_ns, self.logger = threshold_ns, logger
+        self.start = self.elapsed_ns = 0
+
+    def __enter__(self) -> Span:
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.elapsed_ns = perf_counter_ns() - self.start
+        self.recorder.record(self.name, self.elapsed_ns, self.threshold_ns, self.logger)
+
+    async def __aenter__(self) -> Span:
+        return self.__enter__()
+
+    async def __aexit__(self, *args: Any) -> None:
+        self.__exit__(*args)
+
+    def __call__(self, func: SfT) -> SfT:
+        from inspect import iscoroutinefunction
+
+        recorder, args = self.recorder, (self.name, self.threshold_ns, self.logger)
+        if iscoroutinefunction(func):
+            @wraps(func)
+            async def _new_async(*fargs: Any, **fkwargs: Any) -> Any:
+                if not recorder.enabled:
+                    return await func(*fargs, **fkwargs)
+                with Span(recorder, *args):
+                    return await func(*fargs, **fkwargs)
+            return cast(SfT, _new_async)
+
+        @wraps(func)
+        def _new(*fargs: Any, **fkwargs: Any) -> Any:
+            if not recorder.enabled:
+                return func(*fargs, **fkwargs)
+            with Span(recorder, *args):
+                return func(*fargs, **fkwargs)
+        return cast(SfT, _new)
+
+
+class _NullSpan(Span):
+    "無効な時に使われる、何もしない`.Span`です。デコレータとして使った場合は関数をそのまま返します。"
+
+    __slots__ = ()
+
+    def __enter__(self) -> Span:
+        return self
+
+    def __exit__(self, *_: Any) -> None: ...
+
+    def __call__(self, func: SfT) -> SfT:
+        return func
+
+
+class SpanRecorder:
+    """名前ごとに処理時間のヒストグラムを持ち、`.Span`で計測したものを記録するためのクラスです。
+    `enabled`を`False`にすると計測しなくなり、コストはほぼなくなります。
+    （無効な間にデコレータとして使われた関数は、後で有効にしても計測されません。）
+    `threshold_ns`を超えた処理は`logger`に警告として出力されます。"""
+
+    def __init__(
+        self, enabled: bool = True,
+        threshold_ns: int | None = None,
+        logger: Logger | None = None
+    ) -> None:
+        self.enabled, self.threshold_ns, self.logger = enabled, threshold_ns, logger
+        self.histograms = dict[str, LatencyHistogram]()
+        self._null = _NullSpan(self, "")
+
+    def span(
+        self, name: str, threshold_ns: int | None = None,
+        logger: Logger | None = None
+    ) -> Span:
+        "計測するための`.Span`を作ります。"
+        if not self.enabled:
+            return self._null
+        return Span(self, name, threshold_ns, logger)
+
+    def record(
+        self, name: str, elapsed_ns: int,
+        threshold_ns: int | None = None,
+        logger: Logger | None = None
+    ) -> None:
+        "処理時間を記録します。"
+        if (histogram := self.histograms.get(name)) is None:
+            histogram = self.histograms.setdefault(name, LatencyHistogram())
+        histogram.record(elapsed_ns)
+        threshold_ns = threshold_ns or self.threshold_ns
+        if threshold_ns is not None and elapsed_ns > threshold_ns \
+                and (logger := logger or self.logger) is not None:
+            logger.warning(
+                "%sに%.3fミリ秒かかりました。（閾値: %.3fミリ秒）",
+                name, elapsed_ns / 1e6, threshold_ns / 1e6
+            )
+
+    def export(self) -> dict[str, dict[str, float]]:
+        "名前ごとの集計結果を返します。時間の単位はナノ秒です。"
+        return {name: histogram.export() for name, histogram in self.histograms.items()}
+
+    def reset(self) -> None:
+        "記録を全て消します。"
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+
+spans = SpanRecorder()
+"デフォルトの`.SpanRecorder`です。"
+span = spans.span
+"`spans.span`です。"